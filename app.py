@@ -1,29 +1,36 @@
 # 标准库
 import os
-import markdown
-import json
+import hmac
 from datetime import datetime
 from functools import wraps
 
 # 第三方库
-from flask import Flask, render_template, request, redirect, url_for, Response, session, flash, send_file
-from dotenv import load_dotenv
+from flask import render_template, request, redirect, url_for, Response, session, flash, make_response, stream_with_context, abort
+from sqlalchemy.orm import selectinload
 
 # 本地应用模块
-from models import db, Post, Tag, AdminPassword
-
-# 加载环境变量
-load_dotenv()
+from models import db, Post, Tag, AdminPassword, DeletedPost, ArchiveMonth, CHINA_TZ, post_tags, read_only, defer_body
 
+from factory import create_app
 from config import Config
-from feed import generate_feed
-from sitemap import generate_sitemap
+from feed import feed_entries, render_feed, FEED_FORMATS
+from sitemap import generate_sitemap, generate_sitemap_index, sitemap_chunks
+from render import get_rendered, refresh_rendered, rerender_all
+from tag_service import parse_tag_names, resolve_tags, refresh_tag_counts, delete_orphan_tags
+from archive import refresh_archive, month_of, month_range, archive_months, archive_posts
+from related import refresh_related, related_posts
+from pagination import paginate_keyset, cached_count, encode_cursor
+from search import index_posts, remove_posts, search_posts
+from exporter import export_stream, export_filename, EXPORT_FORMATS
+from importer import import_file, IMPORT_EXTENSIONS, FORMAT_ERRORS, BackupFormatError
+from cache import cached_response, response_cache, bump_content_version, content_version, to_aware
+from metrics import request_metrics
+from slowlog import read_slow_queries, summarize
+from compression import compression_cache
+from revisions import save_revision, load_revision, list_revisions, delete_revisions, diff_lines
+from tasks import task, enqueue, task_label, retry_failed, clear_finished, task_counts, recent_tasks
 
-app = Flask(__name__)
-app.config.from_object(Config)
-# 使用配置文件中的SECRET_KEY
-app.secret_key = app.config['SECRET_KEY']
-db.init_app(app)
+app = create_app()
 
 def login_required(f):
     @wraps(f)
@@ -33,55 +40,173 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+PER_PAGE = 10
+
 @app.route('/')
-@app.route('/page/<int:page>')
-def index(page=1):
-    per_page = 10
-    pagination = Post.query.filter_by(is_page=False).order_by(Post.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+@read_only
+@cached_response
+def index():
+    query = Post.query.filter_by(is_page=False)
+    pagination = paginate_keyset(
+        query.options(selectinload(Post.tags), *defer_body()), Post.created_at, Post.id, PER_PAGE,
+        after=request.args.get('after'), before=request.args.get('before'),
+        total=cached_count('index', query))
     posts = pagination.items
-    pages = Post.query.filter_by(is_page=True).all()
+    pages = Post.query.filter_by(is_page=True).options(*defer_body()).all()
     current_year = datetime.now().year
     return render_template('index.html', posts=posts, pages=pages, year=current_year, pagination=pagination, config=app.config)
 
+@app.route('/page/<int:page>')
+@read_only
+def index_page(page):
+    """兼容旧的页码链接，定位到对应位置后跳转到游标分页"""
+    if page <= 1:
+        return redirect(url_for('index'), code=301)
+    boundary = (db.session.query(Post.created_at, Post.id)
+                .filter(Post.is_page == False)
+                .order_by(Post.created_at.desc(), Post.id.desc())
+                .offset((page - 1) * PER_PAGE - 1).first())
+    if boundary is None:
+        return redirect(url_for('index'))
+    return redirect(url_for('index', after=encode_cursor(*boundary)), code=301)
+
 @app.route('/post/<slug>')
+@read_only
+@cached_response
 def post(slug):
     post = Post.query.filter_by(slug=slug).first_or_404()
-    content = markdown.markdown(
-        post.content,
-        extensions=['fenced_code', 'nl2br', 'tables', 'abbr']
-    )
+    content = get_rendered(post)
+    related = [] if post.is_page else related_posts(post.id, app.config['RELATED_POSTS_COUNT'])
     current_year = datetime.now().year
-    return render_template('post.html', title=post.title, content=content, year=current_year, post=post, config=app.config)
+    # 相关文章和标签随其他文章变化，不使用本文的修改时间作为 Last-Modified，由 cached_response 使用全站内容的修改时间
+    return render_template('post.html', title=post.title, content=content, related=related, year=current_year, post=post, config=app.config)
 
 @app.route('/tag/<name>')
+@read_only
+@cached_response
 def tag(name):
     tag = Tag.query.filter_by(name=name).first_or_404()
-    # 获取该标签下的所有文章，按创建时间倒序排列
-    posts = Post.query.join(Post.tags).filter(Tag.name == name).order_by(Post.created_at.desc()).all()
+    # 获取该标签下的文章，按创建时间倒序分页；从 post_tags 的 (tag_id, created_at, post_id) 索引读取，每页只读一页的行
+    query = (Post.query.join(post_tags, post_tags.c.post_id == Post.id)
+             .filter(post_tags.c.tag_id == tag.id, Post.is_page == False))
+    pagination = paginate_keyset(
+        query.options(selectinload(Post.tags), *defer_body()), post_tags.c.created_at, post_tags.c.post_id, PER_PAGE,
+        after=request.args.get('after'), before=request.args.get('before'),
+        total=cached_count(('tag', tag.id), query))
+    posts = pagination.items
     current_year = datetime.now().year
-    return render_template('tag.html', tag=tag, posts=posts, year=current_year, config=app.config)
+    return render_template('tag.html', tag=tag, posts=posts, pagination=pagination, year=current_year, config=app.config)
+
+@app.route('/tag/<name>/page/<int:page>')
+@read_only
+def tag_page(name, page):
+    """标签的页码链接（静态页面使用），跳转到对应的游标分页"""
+    tag = Tag.query.filter_by(name=name).first_or_404()
+    if page <= 1:
+        return redirect(url_for('tag', name=name), code=301)
+    boundary = (db.session.query(post_tags.c.created_at, post_tags.c.post_id)
+                .join(Post, Post.id == post_tags.c.post_id)
+                .filter(post_tags.c.tag_id == tag.id, Post.is_page == False)
+                .order_by(post_tags.c.created_at.desc(), post_tags.c.post_id.desc())
+                .offset((page - 1) * PER_PAGE - 1).first())
+    if boundary is None:
+        return redirect(url_for('tag', name=name))
+    return redirect(url_for('tag', name=name, after=encode_cursor(*boundary)), code=301)
 
 @app.route('/page/<slug>')
+@read_only
+@cached_response
 def page(slug):
     page = Post.query.filter_by(slug=slug, is_page=True).first_or_404()
-    content = markdown.markdown(
-        page.content,
-        extensions=['fenced_code', 'nl2br', 'tables', 'abbr']
-    )
+    content = get_rendered(page)
+    current_year = datetime.now().year
+    response = make_response(render_template('post.html', title=page.title, content=content, year=current_year, post=page, config=app.config))
+    response.last_modified = to_aware(page.updated_at)
+    return response
+
+@app.route('/archive')
+@read_only
+@cached_response
+def archive():
+    months = archive_months()
     current_year = datetime.now().year
-    return render_template('post.html', title=page.title, content=content, year=current_year, post=page, config=app.config)
+    return render_template('archive.html', months=months, year=current_year, config=app.config)
+
+@app.route('/archive/<int:year>')
+@read_only
+@cached_response
+def archive_year(year):
+    months = archive_months(year)
+    if not months:
+        abort(404)
+    posts = archive_posts(month_range(year, 1)[0], month_range(year, 12)[1])
+    current_year = datetime.now().year
+    return render_template('archive.html', months=months, posts=posts, archive_year=year, year=current_year, config=app.config)
+
+@app.route('/archive/<int:year>/<int:month>')
+@read_only
+@cached_response
+def archive_month(year, month):
+    if not 1 <= month <= 12 or db.session.get(ArchiveMonth, (year, month)) is None:
+        abort(404)
+    posts = archive_posts(*month_range(year, month))
+    current_year = datetime.now().year
+    return render_template('archive.html', posts=posts, archive_year=year, archive_month=month, year=current_year, config=app.config)
 
 @app.route('/feed.xml')
+@read_only
+@cached_response
 def feed():
-    posts = Post.query.filter_by(is_page=False).order_by(Post.created_at.desc()).limit(10).all()
-    feed_content = generate_feed(posts, Config())
-    return Response(feed_content, mimetype='application/rss+xml')
+    feed_content = render_feed(feed_entries(Config()), Config(), 'rss')
+    return Response(feed_content, mimetype=FEED_FORMATS['rss'])
+
+@app.route('/atom.xml')
+@read_only
+@cached_response
+def atom_feed():
+    feed_content = render_feed(feed_entries(Config()), Config(), 'atom')
+    return Response(feed_content, mimetype=FEED_FORMATS['atom'])
+
+@app.route('/feed.json')
+@read_only
+@cached_response
+def json_feed():
+    feed_content = render_feed(feed_entries(Config()), Config(), 'json')
+    return Response(feed_content, mimetype=FEED_FORMATS['json'])
 
 @app.route('/sitemap.xml')
+@read_only
+@cached_response
 def sitemap():
-    posts = Post.query.order_by(Post.updated_at.desc()).all()
-    sitemap_content = generate_sitemap(posts, Config())
-    return Response(sitemap_content, mimetype='application/xml')
+    _, changed_at = content_version()
+    chunks = sitemap_chunks()
+    if chunks > 1:
+        # 超过单个 sitemap 的 URL 上限时输出 sitemap 索引
+        sitemap_content = generate_sitemap_index(Config(), changed_at, chunks)
+    else:
+        sitemap_content = generate_sitemap(Config(), changed_at)
+    return Response(stream_with_context(sitemap_content), mimetype='application/xml')
+
+@app.route('/sitemap-<int:chunk>.xml')
+@read_only
+@cached_response
+def sitemap_chunk(chunk):
+    if chunk < 1 or chunk > sitemap_chunks():
+        abort(404)
+    _, changed_at = content_version()
+    sitemap_content = generate_sitemap(Config(), changed_at, chunk)
+    return Response(stream_with_context(sitemap_content), mimetype='application/xml')
+
+@app.route('/search')
+@read_only
+@cached_response
+def search():
+    q = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    results, total = search_posts(q, page=page, per_page=PER_PAGE) if q else ([], 0)
+    page_count = max(1, -(-total // PER_PAGE))
+    current_year = datetime.now().year
+    return render_template('search.html', q=q, results=results, total=total, page=page, page_count=page_count, year=current_year, config=app.config)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -137,16 +262,18 @@ def admin_write():
         post = Post(title=title, content=content, is_page=is_page, slug=slug)
         
         # 处理标签
-        if tags:
-            tag_names = [t.strip() for t in tags.split(',')]
-            for tag_name in tag_names:
-                tag = Tag.query.filter_by(name=tag_name).first()
-                if not tag:
-                    tag = Tag(name=tag_name)
-                post.tags.append(tag)
+        post.tags = list(resolve_tags(parse_tag_names(tags)).values())
         
+        refresh_rendered(post)
         db.session.add(post)
+        db.session.flush()
+        refresh_tag_counts([tag.id for tag in post.tags])
+        refresh_archive([month_of(post)])
+        save_revision(post)
+        index_posts([post.id])
+        enqueue('refresh_related', tag_ids=[tag.id for tag in post.tags], post_ids=[post.id])
         db.session.commit()
+        bump_content_version()
         return redirect(url_for('admin_posts'))
     
     current_year = datetime.now().year
@@ -155,9 +282,11 @@ def admin_write():
 @app.route('/admin/posts')
 @login_required
 def admin_posts():
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
-    pagination = Post.query.filter_by(is_page=False).order_by(Post.updated_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    query = Post.query.filter_by(is_page=False)
+    pagination = paginate_keyset(
+        query.options(selectinload(Post.tags), *defer_body()), Post.updated_at, Post.id, PER_PAGE,
+        after=request.args.get('after'), before=request.args.get('before'),
+        total=cached_count('admin_posts', query))
     posts = pagination.items
     current_year = datetime.now().year
     return render_template('admin_posts.html', posts=posts, pagination=pagination, view_type='posts', year=current_year, config=app.config)
@@ -165,9 +294,11 @@ def admin_posts():
 @app.route('/admin/pages')
 @login_required
 def admin_pages():
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
-    pagination = Post.query.filter_by(is_page=True).order_by(Post.updated_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    query = Post.query.filter_by(is_page=True)
+    pagination = paginate_keyset(
+        query.options(selectinload(Post.tags), *defer_body()), Post.updated_at, Post.id, PER_PAGE,
+        after=request.args.get('after'), before=request.args.get('before'),
+        total=cached_count('admin_pages', query))
     pages = pagination.items
     current_year = datetime.now().year
     return render_template('admin_posts.html', posts=pages, pagination=pagination, view_type='pages', year=current_year, config=app.config)
@@ -176,63 +307,141 @@ def admin_pages():
 def edit(id):
     post = Post.query.get_or_404(id)
     if request.method == 'POST':
+        previous = (post.title, post.content)
         post.title = request.form['title'].strip()
         post.content = request.form['content']
         post.is_page = 'is_page' in request.form
-        post.tags.clear()
+        old_tag_ids = [tag.id for tag in post.tags]
         
         tags = request.form['tags'].strip()
-        if tags:
-            tag_names = [t.strip() for t in tags.split(',')]
-            for tag_name in tag_names:
-                tag = Tag.query.filter_by(name=tag_name).first()
-                if not tag:
-                    tag = Tag(name=tag_name)
-                post.tags.append(tag)
-        
-        db.session.commit()
+        post.tags = list(resolve_tags(parse_tag_names(tags)).values())
+        if set(old_tag_ids) != {tag.id for tag in post.tags}:
+            # 只修改标签时文章行本身没有变化，onupdate 不会生效；增量备份按 updated_at 查找修改过的文章
+            post.updated_at = datetime.now(CHINA_TZ)
         
+        refresh_rendered(post)
+        db.session.flush()
+        refresh_tag_counts(old_tag_ids + [tag.id for tag in post.tags])
+        refresh_archive([month_of(post)])  # 可能改为独立页面
+        save_revision(post, previous)
+        index_posts([post.id])
+        enqueue('refresh_related', tag_ids=sorted(set(old_tag_ids + [tag.id for tag in post.tags])), post_ids=[post.id])
         # 自动清理没有文章的标签
-        cleanup_empty_tags()
+        enqueue('cleanup_tags', tag_ids=sorted(old_tag_ids))
+        db.session.commit()
+        bump_content_version()
         
         return redirect(url_for('admin'))
     
     current_year = datetime.now().year
     return render_template('edit.html', post=post, year=current_year, config=app.config)
 
+@app.route('/admin/revisions/<int:id>')
+@login_required
+def admin_revisions(id):
+    """文章的历史版本"""
+    post = Post.query.get_or_404(id)
+    revisions = list_revisions(id)
+    current_year = datetime.now().year
+    return render_template('admin_revisions.html', post=post, revisions=revisions,
+                           size=sum(r.size for r in revisions), stored=sum(r.stored for r in revisions),
+                           year=current_year, config=app.config)
+
+@app.route('/admin/revisions/<int:id>/<int:number>', methods=['GET', 'POST'])
+@login_required
+def admin_revision(id, number):
+    """查看某个版本与上一版本（或当前内容）的差异，恢复到这个版本"""
+    post = Post.query.get_or_404(id)
+    revision = load_revision(id, number)
+    if revision is None:
+        abort(404)
+    
+    if request.method == 'POST':
+        previous = (post.title, post.content)
+        post.title, post.content = revision.title, revision.content
+        post.updated_at = datetime.now(CHINA_TZ)  # 内容与当前相同时也记为修改，增量备份会包含这篇文章
+        refresh_rendered(post)
+        db.session.flush()
+        save_revision(post, previous)
+        index_posts([post.id])
+        enqueue('refresh_related', tag_ids=sorted(tag.id for tag in post.tags), post_ids=[post.id])
+        db.session.commit()
+        bump_content_version()
+        flash(f'已恢复到第 {number} 个版本')
+        return redirect(url_for('admin_revisions', id=id))
+    
+    compare = request.args.get('compare')
+    if compare == 'current':
+        # 从这个版本到当前内容的变化
+        titles = (revision.title, post.title)
+        diff = diff_lines(revision.content, post.content, f'第 {number} 版', '当前内容')
+    else:
+        base = load_revision(id, number - 1)
+        titles = (base.title if base else revision.title, revision.title)
+        diff = diff_lines(base.content if base else '', revision.content,
+                          f'第 {number - 1} 版' if base else '（无）', f'第 {number} 版')
+    current_year = datetime.now().year
+    return render_template('admin_revision.html', post=post, revision=revision, diff=diff, compare=compare,
+                           titles=titles, year=current_year, config=app.config)
+
 @app.route('/delete/<int:id>')
 def delete(id):
     post = Post.query.get_or_404(id)
+    tag_ids = [tag.id for tag in post.tags]
+    month = month_of(post)
+    if post.slug is not None:
+        db.session.add(DeletedPost(slug=post.slug))  # 供增量备份记录删除
     db.session.delete(post)
-    db.session.commit()
-    
+    db.session.flush()
+    refresh_tag_counts(tag_ids)
+    refresh_archive([month])
+    remove_posts([id])
+    delete_revisions([id])
+    enqueue('refresh_related', tag_ids=sorted(tag_ids), post_ids=[id])
     # 自动清理没有文章的标签
-    cleanup_empty_tags()
+    enqueue('cleanup_tags', tag_ids=sorted(tag_ids))
+    db.session.commit()
+    bump_content_version()
     
     return redirect(url_for('admin'))
 
-def cleanup_empty_tags():
-    """自动清理没有文章的标签"""
-    try:
-        # 查找所有标签
-        all_tags = Tag.query.all()
-        deleted_count = 0
-        
-        for tag in all_tags:
-            # 检查标签下是否有文章
-            if tag.posts.count() == 0:
-                db.session.delete(tag)
-                deleted_count += 1
-        
-        if deleted_count > 0:
-            db.session.commit()
-            print(f'自动清理了 {deleted_count} 个空标签')
-        
-    except Exception as e:
-        print(f'清理空标签时出错：{str(e)}')
-        db.session.rollback()
+# 保存文章后的后台任务，由 tasks.py 的工作线程执行
+
+@task('refresh_related', '更新相关文章')
+def refresh_related_task(tag_ids, post_ids):
+    refresh_related(tag_ids, post_ids)
+    freeze_after_save()
+    db.session.commit()
+    bump_content_version()
+
+@task('cleanup_tags', '清理空标签')
+def cleanup_empty_tags(tag_ids=None):
+    """自动清理没有文章的标签，tag_ids 为 None 时检查全部标签"""
+    deleted_count = delete_orphan_tags(tag_ids)
+    if deleted_count > 0:
+        db.session.commit()
+        bump_content_version()
+        print(f'自动清理了 {deleted_count} 个空标签')
+
+@task('rerender', '渲染文章')
+def rerender_task():
+    checked, updated = rerender_all()
+    if updated:
+        bump_content_version()
+
+@task('freeze', '更新静态页面')
+def freeze_task():
+    from freeze import freeze_site
+    freeze_site(app, os.path.abspath(app.config['FREEZE_OUTPUT_DIR']), workers=1)
+
+def freeze_after_save():
+    """开启 FREEZE_ON_SAVE 时，保存后增量更新静态页面（相关文章更新之后）"""
+    if app.config['FREEZE_ON_SAVE']:
+        enqueue('freeze')
 
 @app.route('/tags')
+@read_only
+@cached_response
 def tags():
     # 获取所有标签，按名称排序
     tags = Tag.query.order_by(Tag.name).all()
@@ -247,58 +456,80 @@ def api_tags():
     tag_list = [tag.name for tag in tags]
     return {'tags': tag_list}
 
+@app.route('/admin/cache', methods=['GET', 'POST'])
+@login_required
+def admin_cache():
+    """查看响应缓存的命中情况"""
+    if request.method == 'POST':
+        bump_content_version()
+        response_cache.clear()
+        compression_cache.clear()
+        flash('缓存已清空')
+        return redirect(url_for('admin_cache'))
+    
+    version, changed_at = content_version()
+    current_year = datetime.now().year
+    compression = compression_cache.info() if 'compression' in app.config['APP_EXTENSIONS'] else None
+    return render_template('admin_cache.html', stats=response_cache.info(), compression=compression, version=version,
+                           changed_at=changed_at.astimezone(CHINA_TZ), pid=os.getpid(), year=current_year, config=app.config)
+
+@app.route('/admin/tasks', methods=['GET', 'POST'])
+@login_required
+def admin_tasks():
+    """查看后台任务的执行情况，重试失败的任务"""
+    if request.method == 'POST':
+        if request.form.get('action') == 'retry':
+            count = retry_failed()
+            flash(f'已重新加入 {count} 个失败的任务')
+        else:
+            count = clear_finished()
+            flash(f'已清除 {count} 条已完成的任务记录')
+        db.session.commit()
+        return redirect(url_for('admin_tasks'))
+    
+    current_year = datetime.now().year
+    return render_template('admin_tasks.html', counts=task_counts(), tasks=recent_tasks(100), task_label=task_label,
+                           year=current_year, config=app.config)
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    """Prometheus 文本格式的性能指标，登录后可查看，也可用 METRICS_TOKEN 抓取"""
+    token = app.config['METRICS_TOKEN']
+    authorized = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not session.get('logged_in') and not authorized:
+        return redirect(url_for('login'))
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/slow-queries')
+@login_required
+def admin_slow_queries():
+    """查看慢查询日志：按语句汇总和最近的记录"""
+    entries = read_slow_queries(app.config['SLOW_QUERY_LOG'])
+    current_year = datetime.now().year
+    return render_template('admin_slow_queries.html', entries=entries[:50], groups=summarize(entries),
+                           enabled=app.config['SLOW_QUERY_ENABLED'], threshold=app.config['SLOW_QUERY_THRESHOLD_MS'],
+                           year=current_year, config=app.config)
+
 @app.route('/admin/export')
 @login_required
+@read_only
 def admin_export():
-    """导出所有数据为JSON文件"""
-    try:
-        # 获取所有数据
-        posts = Post.query.all()
-        tags = Tag.query.all()
-        
-        # 构建导出数据结构
-        export_data = {
-            'version': '1.0',
-            'exported_at': datetime.now().isoformat(),
-            'posts': [],
-            'tags': []
-        }
-        
-        # 导出标签
-        for tag in tags:
-            tag_data = {
-                'id': tag.id,
-                'name': tag.name
-            }
-            export_data['tags'].append(tag_data)
-        
-        # 导出文章
-        for post in posts:
-            post_data = {
-                'id': post.id,
-                'title': post.title,
-                'content': post.content,
-                'created_at': post.created_at.isoformat(),
-                'updated_at': post.updated_at.isoformat(),
-                'is_page': post.is_page,
-                'slug': post.slug,
-                'tags': [tag.name for tag in post.tags]
-            }
-            export_data['posts'].append(post_data)
-        
-        # 创建临时文件到backups文件夹
-        export_filename = f'backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
-        export_path = os.path.join(os.getcwd(), 'backups', export_filename)
-        
-        with open(export_path, 'w', encoding='utf-8') as f:
-            json.dump(export_data, f, ensure_ascii=False, indent=2)
-        
-        flash(f'数据导出成功！文件：{export_filename}')
-        return send_file(export_path, as_attachment=True, download_name=export_filename)
-        
-    except Exception as e:
-        flash(f'导出失败：{str(e)}')
+    """导出所有数据，边查询边输出，不在内存或磁盘上生成完整文件
+
+    ?format=ndjson 导出为每行一条记录，?gzip=1 压缩输出。
+    """
+    fmt = request.args.get('format', 'json')
+    if fmt not in EXPORT_FORMATS:
+        flash(f'不支持的导出格式：{fmt}')
         return redirect(url_for('admin'))
+    compress = request.args.get('gzip') in ('1', 'true', 'yes')
+
+    filename = export_filename(fmt, compress)
+    response = Response(stream_with_context(export_stream(fmt, compress)),
+                        mimetype='application/gzip' if compress else EXPORT_FORMATS[fmt][1])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/admin/import', methods=['GET', 'POST'])
 @login_required
@@ -314,74 +545,26 @@ def admin_import():
             flash('请选择要导入的文件')
             return redirect(request.url)
         
-        if not file.filename.endswith('.json'):
-            flash('请选择JSON格式的文件')
+        if not file.filename.endswith(IMPORT_EXTENSIONS):
+            flash('请选择JSON、NDJSON格式（或gzip压缩）的备份文件')
             return redirect(request.url)
         
+        conflict = request.form.get('conflict', 'skip')
         try:
-            # 读取JSON文件
-            import_data = json.load(file)
-            
-            # 验证数据格式
-            if not isinstance(import_data, dict) or 'posts' not in import_data or 'tags' not in import_data:
-                flash('文件格式错误：缺少必要的数据字段')
-                return redirect(request.url)
-            
-            # 开始导入
-            imported_count = 0
-            
-            # 导入标签
-            tag_map = {}  # 用于映射旧ID到新ID
-            for tag_data in import_data.get('tags', []):
-                existing_tag = Tag.query.filter_by(name=tag_data['name']).first()
-                if not existing_tag:
-                    new_tag = Tag(name=tag_data['name'])
-                    db.session.add(new_tag)
-                    db.session.flush()  # 获取新ID
-                    tag_map[tag_data['id']] = new_tag.id
-                    imported_count += 1
-                else:
-                    tag_map[tag_data['id']] = existing_tag.id
-            
-            # 导入文章
-            for post_data in import_data.get('posts', []):
-                # 检查是否已存在相同slug的文章
-                existing_post = Post.query.filter_by(slug=post_data['slug']).first()
-                if existing_post:
-                    # 如果存在，跳过或更新（这里选择跳过）
-                    continue
-                
-                # 创建新文章
-                new_post = Post(
-                    title=post_data['title'],
-                    content=post_data['content'],
-                    is_page=post_data['is_page'],
-                    slug=post_data['slug']
-                )
-                
-                # 设置时间
-                try:
-                    new_post.created_at = datetime.fromisoformat(post_data['created_at'])
-                    new_post.updated_at = datetime.fromisoformat(post_data['updated_at'])
-                except:
-                    pass  # 使用默认时间
-                
-                # 添加标签
-                for tag_name in post_data.get('tags', []):
-                    tag = Tag.query.filter_by(name=tag_name).first()
-                    if tag:
-                        new_post.tags.append(tag)
-                
-                db.session.add(new_post)
-                imported_count += 1
-            
+            # 边读边导入，按批次提交
+            stats = import_file(file.stream, conflict=conflict, batch_size=app.config['IMPORT_BATCH_SIZE'])
+            # 导入时不渲染正文，由后台任务提前渲染，避免访问时才渲染
+            enqueue('rerender')
+            freeze_after_save()
             db.session.commit()
-            flash(f'数据导入成功！共导入 {imported_count} 条记录')
+            flash(f'数据导入成功！新增 {stats.created} 篇文章，更新 {stats.updated} 篇，跳过 {stats.skipped} 篇，'
+                  f'新建 {stats.tags_created} 个标签，用时 {stats.elapsed:.1f} 秒')
             
-        except json.JSONDecodeError:
+        except BackupFormatError as e:
+            flash(str(e))
+        except FORMAT_ERRORS:
             flash('文件格式错误：不是有效的JSON文件')
         except Exception as e:
-            db.session.rollback()
             flash(f'导入失败：{str(e)}')
         
         return redirect(url_for('admin'))
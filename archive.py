@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, Post, ArchiveMonth
+
+def month_range(year, month):
+    """返回 [月初, 下月初)，用于按创建时间的范围查询（可以使用 created_at 索引）"""
+    return datetime(year, month, 1), datetime(year + month // 12, month % 12 + 1, 1)
+
+def month_of(post):
+    return post.created_at.year, post.created_at.month
+
+def refresh_archive(months=None):
+    """重新统计按月归档的文章数，months 为 [(年, 月)]，为 None 时全部重新统计（初始化和导入后使用）"""
+    if months is None:
+        year = func.cast(func.strftime('%Y', Post.created_at), db.Integer)
+        month = func.cast(func.strftime('%m', Post.created_at), db.Integer)
+        rows = (db.session.query(year, month, func.count(Post.id))
+                .filter(Post.is_page == False, Post.created_at.isnot(None))
+                .group_by(year, month).all())
+        db.session.execute(delete(ArchiveMonth))
+        if rows:
+            db.session.execute(insert(ArchiveMonth), [{'year': y, 'month': m, 'post_count': count} for y, m, count in rows])
+        return
+
+    for year, month in set(months):
+        start, end = month_range(year, month)
+        count = (db.session.query(func.count(Post.id))
+                 .filter(Post.is_page == False, Post.created_at >= start, Post.created_at < end).scalar())
+        if count:
+            stmt = insert(ArchiveMonth).values(year=year, month=month, post_count=count)
+            db.session.execute(stmt.on_conflict_do_update(index_elements=['year', 'month'],
+                                                          set_={'post_count': count}))
+        else:
+            db.session.execute(delete(ArchiveMonth).where(ArchiveMonth.year == year, ArchiveMonth.month == month))
+
+def archive_months(year=None):
+    """各月的文章数，从新到旧"""
+    query = ArchiveMonth.query
+    if year is not None:
+        query = query.filter_by(year=year)
+    return query.order_by(ArchiveMonth.year.desc(), ArchiveMonth.month.desc()).all()
+
+def archive_posts(start, end):
+    """[start, end) 之间创建的文章，只读取标题、slug 和创建时间"""
+    return (db.session.query(Post.title, Post.slug, Post.created_at)
+            .filter(Post.is_page == False, Post.created_at >= start, Post.created_at < end)
+            .order_by(Post.created_at.desc(), Post.id.desc()).all())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+PurEcho 静态资源工具
+压缩 static/ 中的 CSS、JS，按内容哈希命名写入 static/dist/，并预先生成 gzip 文件
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+import mimetypes
+from contextlib import suppress
+
+from flask import request, send_from_directory
+
+# 添加项目路径到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DIST_DIR = 'dist'
+MANIFEST_FILE = 'manifest.json'
+ASSET_EXTENSIONS = ('.css', '.js')
+
+# CSS 中的字符串不做处理
+_CSS_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+
+def minify_css(text):
+    """去掉注释和多余的空白"""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    parts = _CSS_STRING.split(text)
+    for i in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[i])
+        part = re.sub(r'\s*([{};,>])\s*', r'\1', part)
+        parts[i] = re.sub(r':\s+', ':', part).replace(';}', '}')
+    return ''.join(parts).strip()
+
+def minify_js(text):
+    """只去掉缩进、空行和整行注释，保留换行（不依赖分号也能正确解析）"""
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _sources(static_folder):
+    """static/ 中需要处理的文件（相对路径），不含 dist/"""
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != os.path.join(static_folder, DIST_DIR))
+        for name in sorted(files):
+            if name.endswith(ASSET_EXTENSIONS):
+                yield os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/')
+
+def load_manifest(static_folder):
+    """返回 {原文件名: dist/ 中带哈希的文件名}，没有生成过时返回空字典"""
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def is_stale(static_folder):
+    """没有生成过，或源文件在上次生成之后有修改"""
+    try:
+        built = os.path.getmtime(os.path.join(static_folder, DIST_DIR, MANIFEST_FILE))
+    except OSError:
+        return True
+    return any(os.path.getmtime(os.path.join(static_folder, relpath)) > built for relpath in _sources(static_folder))
+
+def build_assets(static_folder):
+    """生成 dist/<名称>.<哈希>.<扩展名> 和对应的 .gz，返回新的清单
+
+    内容没有变化的文件不重写；上一版本的文件保留一轮，部署时已打开的旧页面仍能加载。
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    previous = load_manifest(static_folder)
+    manifest = {}
+    for relpath in _sources(static_folder):
+        with open(os.path.join(static_folder, relpath), 'r', encoding='utf-8') as f:
+            text = f.read()
+        data = (minify_css(text) if relpath.endswith('.css') else minify_js(text)).encode('utf-8')
+        stem, ext = os.path.splitext(relpath)
+        hashed = f'{DIST_DIR}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        path = os.path.join(static_folder, hashed)
+        if not os.path.exists(path):
+            _write(path + '.gz', gzip.compress(data, 9, mtime=0))
+            _write(path, data)
+        manifest[relpath] = hashed
+
+    keep = {MANIFEST_FILE}
+    for hashed in list(manifest.values()) + list(previous.values()):
+        keep.update({hashed[len(DIST_DIR) + 1:], hashed[len(DIST_DIR) + 1:] + '.gz'})
+    for root, _, files in os.walk(dist):
+        for name in files:
+            relpath = os.path.relpath(os.path.join(root, name), dist).replace(os.sep, '/')
+            if relpath not in keep:
+                with suppress(FileNotFoundError):  # 多个 worker 同时启动时可能已被删除
+                    os.remove(os.path.join(root, name))
+
+    if manifest != previous or not os.path.exists(os.path.join(dist, MANIFEST_FILE)):
+        _write(os.path.join(dist, MANIFEST_FILE), json.dumps(manifest, indent=2).encode('utf-8'))
+    else:
+        os.utime(os.path.join(dist, MANIFEST_FILE))
+    return manifest
+
+def init_assets(app):
+    """url_for('static', filename=...) 指向 dist/ 中带哈希的文件，这些文件带一年的不可变缓存头
+
+    ASSET_BUILD_ON_START 为 true 时，源文件有修改会在启动时重新生成。
+    """
+    if not app.config['ASSET_FINGERPRINT']:
+        return
+    static_folder = app.static_folder
+    if app.config['ASSET_BUILD_ON_START'] and is_stale(static_folder):
+        manifest = build_assets(static_folder)
+    else:
+        manifest = load_manifest(static_folder)
+    app.extensions['assets'] = manifest
+
+    @app.url_defaults
+    def fingerprint(endpoint, values):
+        if endpoint == 'static':
+            hashed = manifest.get(values.get('filename'))
+            if hashed:
+                values['filename'] = hashed
+
+    serve_static = app.view_functions['static']
+    max_age = app.config['ASSET_MAX_AGE']
+
+    def static(filename):
+        if not filename.startswith(DIST_DIR + '/') or filename.endswith(('.gz', MANIFEST_FILE)):
+            return serve_static(filename=filename)
+        # 文件名随内容变化，可以永久缓存；客户端支持时直接发送预先压缩的文件
+        gz_path = os.path.join(static_folder, filename + '.gz')
+        if request.accept_encodings['gzip'] and os.path.isfile(gz_path):
+            response = send_from_directory(static_folder, filename + '.gz', max_age=max_age,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = send_from_directory(static_folder, filename, max_age=max_age)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static
+
+def main():
+    from factory import create_app
+
+    app = create_app(web=False)
+    manifest = build_assets(app.static_folder)
+    for relpath, hashed in manifest.items():
+        before = os.path.getsize(os.path.join(app.static_folder, relpath))
+        after = os.path.getsize(os.path.join(app.static_folder, hashed))
+        compressed = os.path.getsize(os.path.join(app.static_folder, hashed + '.gz'))
+        print(f'  📄 {relpath} -> {hashed}（{before} -> {after} 字节，gzip {compressed} 字节）')
+    print(f'✅ 静态资源生成完成，共 {len(manifest)} 个文件')
+
+if __name__ == '__main__':
+    main()
@@ -1,75 +1,77 @@
 #!/usr/bin/env python3
 """
 PurEcho 数据备份工具
-支持导出和导入所有博客数据
+支持导出和导入所有博客数据，以及数据库文件快照
 """
 
 import os
 import sys
-import json
 import argparse
-from datetime import datetime
 
 # 添加项目路径到Python路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, db
-from models import Post, Tag
+from factory import create_app
+from models import db
+from render import rerender_all
+from cache import bump_content_version
+from search import rebuild_index
+from related import rebuild_related
+from revisions import prune_all_revisions
+from exporter import write_export, export_filename, EXPORT_FORMATS
+from importer import import_file, FORMAT_ERRORS, BackupFormatError
+from snapshot import database_path, create_snapshot, restore_snapshot, rotate_snapshots
+from manifest import load_manifest, save_manifest, latest_backup, watermark, since, new_entry, restore_chain, prune_deleted, OVERLAP
 
-def export_data(output_file=None):
-    """导出所有数据到JSON文件"""
+# 只需要数据库，不加载网站的路由和模板
+app = create_app(web=False)
+
+def export_data(output_file=None, fmt='json', compress=False, incremental=False):
+    """导出数据到JSON文件（分批查询、边读边写，可选 gzip 压缩）
+
+    incremental 为 True 时只导出上一次备份之后修改和删除的文章。
+    每次导出都记录在 backups/manifest.json 中，增量备份指向上一次备份和所属的完整备份。
+    """
     with app.app_context():
         try:
-            # 获取所有数据
-            posts = Post.query.all()
-            tags = Tag.query.all()
-            
-            # 构建导出数据结构
-            export_data = {
-                'version': '1.0',
-                'exported_at': datetime.now().isoformat(),
-                'posts': [],
-                'tags': []
-            }
-            
-            # 导出标签
-            for tag in tags:
-                tag_data = {
-                    'id': tag.id,
-                    'name': tag.name
-                }
-                export_data['tags'].append(tag_data)
-            
-            # 导出文章
-            for post in posts:
-                post_data = {
-                    'id': post.id,
-                    'title': post.title,
-                    'content': post.content,
-                    'created_at': post.created_at.isoformat(),
-                    'updated_at': post.updated_at.isoformat(),
-                    'is_page': post.is_page,
-                    'slug': post.slug,
-                    'tags': [tag.name for tag in post.tags]
-                }
-                export_data['posts'].append(post_data)
+            # 确保backups文件夹存在
+            backups_dir = os.path.join(os.getcwd(), 'backups')
+            os.makedirs(backups_dir, exist_ok=True)
+            
+            manifest = load_manifest(backups_dir)
+            parent = latest_backup(backups_dir, manifest) if incremental else None
+            if incremental and parent is None:
+                print('⚠️  没有找到上一次备份，改为完整备份')
+            kind = 'incremental' if parent else 'full'
             
             # 生成文件名到backups文件夹
             if not output_file:
-                output_file = f'backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+                output_file = export_filename(fmt, compress)
+                if parent:
+                    output_file = output_file.replace('backup_', 'backup_incr_', 1)
             
-            # 确保backups文件夹存在
-            backups_dir = os.path.join(os.getcwd(), 'backups')
-            os.makedirs(backups_dir, exist_ok=True)
+            # 先记录水位再导出，导出期间的修改会被下一次增量备份包含
+            mark = watermark()
+            entry = new_entry(output_file, kind, mark, parent)
             
             # 写入文件到backups文件夹
             output_path = os.path.join(backups_dir, output_file)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, ensure_ascii=False, indent=2)
+            stats = write_export(output_path, fmt, compress, since=since(parent) if parent else None,
+                                 meta={key: entry[key] for key in ('type', 'base', 'parent', 'watermark', 'max_id')})
+            
+            entry.update(stats, size=os.path.getsize(output_path))
+            manifest['backups'] = [item for item in manifest['backups'] if item['file'] != output_file] + [entry]
+            save_manifest(backups_dir, manifest)
+            if kind == 'full':
+                prune_deleted(mark[0] - OVERLAP)
             
             print(f'✅ 数据导出成功！')
             print(f'📁 文件：backups/{output_file}')
-            print(f'📊 统计：{len(posts)} 篇文章，{len(tags)} 个标签')
+            if parent:
+                print(f'🔗 增量备份，上一次备份：{parent["file"]}，完整备份：{entry["base"]}')
+                print(f'📊 统计：{stats["posts"]} 篇修改的文章，{stats["deleted"]} 篇删除的文章')
+            else:
+                print(f'📊 统计：{stats["posts"]} 篇文章，{stats["tags"]} 个标签')
             
         except Exception as e:
             print(f'❌ 导出失败：{str(e)}')
@@ -77,8 +79,13 @@ def export_data(output_file=None):
     
     return True
 
-def import_data(input_file, force=False):
-    """从JSON文件导入数据"""
+def import_data(input_file, force=False, conflict='skip', batch_size=None, render=False, chain=False):
+    """从JSON / NDJSON 文件（可为 gzip 压缩）导入数据
+
+    conflict 为 update 时用备份内容覆盖 slug 相同的文章。
+    render 为 False 时导入后文章在首次访问时渲染，也可以运行 rerender 提前渲染。
+    chain 为 True 时按备份清单从完整备份开始依次导入到 input_file（覆盖方式），恢复增量备份。
+    """
     with app.app_context():
         try:
             # 检查文件路径
@@ -93,17 +100,22 @@ def import_data(input_file, force=False):
                     if os.path.exists(current_path):
                         input_file = current_path
             
-            # 读取JSON文件
-            with open(input_file, 'r', encoding='utf-8') as f:
-                import_data = json.load(f)
+            if not os.path.exists(input_file):
+                raise FileNotFoundError(input_file)
             
-            # 验证数据格式
-            if not isinstance(import_data, dict) or 'posts' not in import_data or 'tags' not in import_data:
-                print('❌ 文件格式错误：缺少必要的数据字段')
-                return False
+            files = [input_file]
+            if chain:
+                backups_dir = os.path.dirname(os.path.abspath(input_file))
+                entries = restore_chain(load_manifest(backups_dir), os.path.basename(input_file))
+                files = [os.path.join(backups_dir, entry['file']) for entry in entries]
+                conflict = 'update'
+                print(f'🔗 恢复备份链（共 {len(files)} 个文件）：')
+                for entry in entries:
+                    print(f'  {"📦" if entry["type"] == "full" else "➕"} {entry["file"]}')
             
-            print(f'📖 正在读取备份文件：{input_file}')
-            print(f'📊 备份包含：{len(import_data["posts"])} 篇文章，{len(import_data["tags"])} 个标签')
+            for path in files:
+                if not os.path.exists(path):
+                    raise FileNotFoundError(path)
             
             if not force:
                 confirm = input('⚠️  这将导入数据到当前数据库，是否继续？(y/N): ')
@@ -111,89 +123,206 @@ def import_data(input_file, force=False):
                     print('❌ 操作已取消')
                     return False
             
-            # 开始导入
-            imported_count = 0
-            
-            # 导入标签
-            tag_map = {}  # 用于映射旧ID到新ID
-            for tag_data in import_data.get('tags', []):
-                existing_tag = Tag.query.filter_by(name=tag_data['name']).first()
-                if not existing_tag:
-                    new_tag = Tag(name=tag_data['name'])
-                    db.session.add(new_tag)
-                    db.session.flush()  # 获取新ID
-                    tag_map[tag_data['id']] = new_tag.id
-                    imported_count += 1
-                    print(f'  ➕ 创建标签：{tag_data["name"]}')
-                else:
-                    tag_map[tag_data['id']] = existing_tag.id
-                    print(f'  ⏭️  跳过已存在标签：{tag_data["name"]}')
-            
-            # 导入文章
-            for post_data in import_data.get('posts', []):
-                # 检查是否已存在相同slug的文章
-                existing_post = Post.query.filter_by(slug=post_data['slug']).first()
-                if existing_post:
-                    print(f'  ⏭️  跳过已存在文章：{post_data["title"]}')
-                    continue
-                
-                # 创建新文章
-                new_post = Post(
-                    title=post_data['title'],
-                    content=post_data['content'],
-                    is_page=post_data['is_page'],
-                    slug=post_data['slug']
-                )
-                
-                # 设置时间
-                try:
-                    new_post.created_at = datetime.fromisoformat(post_data['created_at'])
-                    new_post.updated_at = datetime.fromisoformat(post_data['updated_at'])
-                except:
-                    pass  # 使用默认时间
+            def report(stats):
+                print(f'  ⏳ 已处理 {stats.processed} 篇文章（新增 {stats.created}，更新 {stats.updated}，'
+                      f'跳过 {stats.skipped}），{stats.rate:.0f} 篇/秒')
+            
+            rendered_later = False
+            changed = False
+            for input_file in files:
+                print(f'📖 正在读取备份文件：{input_file}')
+                print(f'📦 文件大小：{os.path.getsize(input_file) / 1024 / 1024:.1f} MB')
                 
-                # 添加标签
-                for tag_name in post_data.get('tags', []):
-                    tag = Tag.query.filter_by(name=tag_name).first()
-                    if tag:
-                        new_post.tags.append(tag)
+                # 边读边导入，按批次提交
+                with open(input_file, 'rb') as f:
+                    stats = import_file(f, conflict=conflict, batch_size=batch_size or app.config['IMPORT_BATCH_SIZE'],
+                                        progress=report, render=render)
                 
-                db.session.add(new_post)
-                imported_count += 1
-                print(f'  ➕ 导入文章：{post_data["title"]}')
+                print(f'✅ 数据导入成功！新增 {stats.created} 篇文章，更新 {stats.updated} 篇，跳过 {stats.skipped} 篇，'
+                      f'删除 {stats.deleted} 篇，新建 {stats.tags_created} 个标签')
+                print(f'⏱️  用时 {stats.elapsed:.1f} 秒，平均 {stats.rate:.0f} 篇/秒')
+                rendered_later = rendered_later or bool(not render and stats.created + stats.updated)
+                changed = changed or bool(stats.created + stats.updated + stats.deleted)
             
-            db.session.commit()
-            print(f'✅ 数据导入成功！共导入 {imported_count} 条记录')
+            if rendered_later:
+                print('💡 提示：导入的文章会在首次访问时渲染，可运行 python backup.py rerender 提前渲染')
+            if changed:
+                print('💡 提示：相关文章由网站进程的后台任务更新，网站未运行时可执行 python tasks.py')
             
-        except FileNotFoundError:
-            print(f'❌ 文件不存在：{input_file}')
+        except FileNotFoundError as e:
+            print(f'❌ 文件不存在：{e.args[0]}')
             print('💡 提示：可以尝试将文件放在 backups/ 文件夹中')
             return False
-        except json.JSONDecodeError:
+        except BackupFormatError as e:
+            print(f'❌ {e}')
+            return False
+        except FORMAT_ERRORS:
             print('❌ 文件格式错误：不是有效的JSON文件')
             return False
         except Exception as e:
-            db.session.rollback()
             print(f'❌ 导入失败：{str(e)}')
             return False
     
     return True
 
+def rerender(force=False):
+    """重新渲染所有文章的HTML缓存（修改 markdown 扩展后使用）"""
+    with app.app_context():
+        try:
+            checked, updated = rerender_all(force=force)
+            if updated:
+                bump_content_version()
+            print(f'✅ 渲染完成！检查 {checked} 篇，重新渲染 {updated} 篇')
+        except Exception as e:
+            db.session.rollback()
+            print(f'❌ 渲染失败：{str(e)}')
+            return False
+    
+    return True
+
+def reindex():
+    """重建全文搜索索引"""
+    with app.app_context():
+        try:
+            total = rebuild_index()
+            bump_content_version()
+            print(f'✅ 索引重建完成！共索引 {total} 篇文章')
+        except Exception as e:
+            db.session.rollback()
+            print(f'❌ 索引重建失败：{str(e)}')
+            return False
+    
+    return True
+
+def related(workers=None):
+    """重新计算全部文章的相关文章（修改 RELATED_* 配置后使用）"""
+    with app.app_context():
+        try:
+            total = rebuild_related(workers)
+            db.session.commit()
+            bump_content_version()
+            print(f'✅ 相关文章计算完成！共 {total} 篇文章')
+        except Exception as e:
+            db.session.rollback()
+            print(f'❌ 相关文章计算失败：{str(e)}')
+            return False
+    
+    return True
+
+def revisions(keep=None):
+    """清理历史版本（调小 REVISION_KEEP 后使用）"""
+    with app.app_context():
+        try:
+            keep = app.config['REVISION_KEEP'] if keep is None else keep
+            deleted = prune_all_revisions(keep)
+            db.session.commit()
+            print(f'✅ 历史版本清理完成！删除 {deleted} 个版本')
+        except Exception as e:
+            db.session.rollback()
+            print(f'❌ 历史版本清理失败：{str(e)}')
+            return False
+    
+    return True
+
+def _progress(copied, total):
+    if total:
+        print(f'\r  ⏳ 已复制 {copied}/{total} 页（{copied * 100 // total}%）', end='', flush=True)
+
+def snapshot(compress=False, keep=None):
+    """用 SQLite 在线备份 API 复制整个数据库文件（包括管理员密码和全文索引）"""
+    with app.app_context():
+        try:
+            db_path = database_path(app.config['SQLALCHEMY_DATABASE_URI'])
+            backups_dir = os.path.join(os.getcwd(), 'backups')
+            path = create_snapshot(db_path, backups_dir, compress, progress=_progress)
+            print()
+            print(f'✅ 快照创建成功，完整性检查通过！')
+            print(f'📁 文件：backups/{os.path.basename(path)}（{os.path.getsize(path) / 1024 / 1024:.1f} MB）')
+            
+            keep = app.config['SNAPSHOT_KEEP'] if keep is None else keep
+            for name in rotate_snapshots(backups_dir, keep):
+                print(f'  🗑️  删除旧快照：{name}')
+        except Exception as e:
+            print()
+            print(f'❌ 快照失败：{str(e)}')
+            return False
+    
+    return True
+
+def restore(input_file, force=False):
+    """用快照覆盖当前数据库，覆盖前会先为当前数据库创建快照"""
+    with app.app_context():
+        try:
+            if not os.path.isabs(input_file) and not os.path.exists(input_file):
+                input_file = os.path.join(os.getcwd(), 'backups', input_file)
+            if not os.path.exists(input_file):
+                print(f'❌ 文件不存在：{input_file}')
+                return False
+            
+            db_path = database_path(app.config['SQLALCHEMY_DATABASE_URI'])
+            print(f'📖 快照文件：{input_file}')
+            if not force:
+                confirm = input('⚠️  这将用快照覆盖当前数据库的全部数据，是否继续？(y/N): ')
+                if confirm.lower() != 'y':
+                    print('❌ 操作已取消')
+                    return False
+            
+            def save_current():
+                if os.path.exists(db_path):
+                    current = create_snapshot(db_path, os.path.join(os.getcwd(), 'backups'), compress=True)
+                    print(f'💾 快照校验通过，已为当前数据库创建快照：backups/{os.path.basename(current)}')
+            
+            db.engine.dispose()  # 关闭连接池中的连接，恢复后重新连接
+            restore_snapshot(input_file, db_path, progress=_progress, before_restore=save_current)
+            print()
+            bump_content_version()
+            print('✅ 恢复成功！')
+        except Exception as e:
+            print()
+            print(f'❌ 恢复失败：{str(e)}')
+            return False
+    
+    return True
+
 def main():
     parser = argparse.ArgumentParser(description='PurEcho 数据备份工具')
-    parser.add_argument('action', choices=['export', 'import'], help='操作类型')
+    parser.add_argument('action', choices=['export', 'import', 'rerender', 'reindex', 'related', 'revisions', 'snapshot', 'restore'], help='操作类型')
     parser.add_argument('file', nargs='?', help='文件路径')
-    parser.add_argument('--force', '-f', action='store_true', help='强制导入（跳过确认）')
+    parser.add_argument('--force', '-f', action='store_true', help='强制导入或恢复（跳过确认）；rerender 时重新渲染全部文章')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='json', help='导出格式：json 或 ndjson（每行一条记录）')
+    parser.add_argument('--gzip', '-z', action='store_true', help='导出或创建快照时使用 gzip 压缩')
+    parser.add_argument('--update', '-u', action='store_true', help='导入时用备份内容覆盖 slug 相同的文章（默认跳过）')
+    parser.add_argument('--batch-size', type=int, help='导入时每批提交的文章数（默认读取 IMPORT_BATCH_SIZE）')
+    parser.add_argument('--render', action='store_true', help='导入时同时渲染文章HTML（较慢）')
+    parser.add_argument('--incremental', '-i', action='store_true', help='增量导出：只导出上一次备份之后修改和删除的文章')
+    parser.add_argument('--chain', action='store_true', help='导入时按备份清单从完整备份开始依次恢复到指定的增量备份')
+    parser.add_argument('--keep', type=int, help='创建快照后保留的快照数量（默认读取 SNAPSHOT_KEEP）；revisions 时为每篇文章保留的版本数（默认读取 REVISION_KEEP）')
+    parser.add_argument('--workers', '-w', type=int, help='计算相关文章的进程数（默认读取 RELATED_WORKERS）')
     
     args = parser.parse_args()
     
     if args.action == 'export':
-        export_data(args.file)
+        export_data(args.file, args.format, args.gzip, args.incremental)
     elif args.action == 'import':
         if not args.file:
             print('❌ 导入操作需要指定文件路径')
             sys.exit(1)
-        import_data(args.file, args.force)
+        import_data(args.file, args.force, 'update' if args.update else 'skip', args.batch_size, args.render, args.chain)
+    elif args.action == 'rerender':
+        rerender(args.force)
+    elif args.action == 'reindex':
+        reindex()
+    elif args.action == 'related':
+        related(args.workers)
+    elif args.action == 'revisions':
+        revisions(args.keep)
+    elif args.action == 'snapshot':
+        snapshot(args.gzip, args.keep)
+    elif args.action == 'restore':
+        if not args.file:
+            print('❌ 恢复操作需要指定快照文件')
+            sys.exit(1)
+        restore(args.file, args.force)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
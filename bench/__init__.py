@@ -0,0 +1 @@
+"""PurEcho 性能基准测试，运行方式：python -m bench --help"""
@@ -0,0 +1,167 @@
+"""
+PurEcho 性能基准测试
+在临时目录中生成固定随机种子的测试数据库，测量各路由和 feed、sitemap、备份函数的耗时、SQL 查询数和内存峰值
+"""
+
+import io
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import argparse
+import platform
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m bench', description='PurEcho 性能基准测试')
+    corpus = parser.add_argument_group('测试数据')
+    corpus.add_argument('--posts', type=int, default=1000, help='文章数（默认 1000）')
+    corpus.add_argument('--tags', type=int, default=200, help='标签数（默认 200）')
+    corpus.add_argument('--tags-per-post', type=int, default=3, help='每篇文章的标签数（默认 3）')
+    corpus.add_argument('--pages', type=int, default=3, help='独立页面数（默认 3）')
+    corpus.add_argument('--paragraphs', type=int, default=8, help='每篇文章的段落数，决定正文长度（默认 8）')
+    corpus.add_argument('--code-blocks', type=int, default=1, help='每篇文章的代码块数（默认 1）')
+    corpus.add_argument('--cjk', type=float, default=0.5, help='中文句子的比例，0 到 1（默认 0.5）')
+    corpus.add_argument('--seed', type=int, default=42, help='随机种子（默认 42）')
+    run = parser.add_argument_group('运行')
+    run.add_argument('--repeat', type=int, default=30, help='每项计时次数（默认 30）')
+    run.add_argument('--rounds', type=int, default=3, help='计时次数分成几轮，各项按轮交替运行（默认 3）')
+    run.add_argument('--warmup', type=int, default=2, help='每项每轮的预热次数（默认 2）')
+    run.add_argument('--backup-repeat', type=int, default=3, help='导出、导入的计时次数（默认 3）')
+    run.add_argument('--only', help='只运行名称包含该字符串的项目')
+    run.add_argument('--cache', action='store_true', help='开启响应缓存（默认关闭，测量实际渲染）')
+    run.add_argument('--workdir', help='测试数据库和备份文件所在目录（默认使用临时目录，结束后删除）')
+    result = parser.add_argument_group('结果')
+    result.add_argument('--save', metavar='FILE', help='把结果保存为 JSON，可作为之后的基线')
+    result.add_argument('--baseline', '--compare', metavar='FILE', dest='baseline', help='与基线 JSON 比较，有退化时退出码为 1')
+    result.add_argument('--threshold', type=float, default=0.5, help='截尾均值和 p50 都变慢超过该比例视为退化（默认 0.5）')
+    result.add_argument('--min-delta', type=float, default=1.0, help='同时还要变慢超过这么多毫秒才视为退化（默认 1）')
+    return parser.parse_args()
+
+def print_results(results):
+    print(f'{"项目":<36} {"均值":>9} {"p50":>9} {"p90":>9} {"p99":>9} {"查询":>7} {"内存KB":>8}')
+    for name, r in results.items():
+        print(f'{name:<36} {r["trimmed"]:>9.2f} {r["p50"]:>9.2f} {r["p90"]:>9.2f} {r["p99"]:>9.2f} {r["queries"]:>7.1f} {r["peak_kb"]:>8}')
+
+def print_comparison(rows):
+    print(f'{"项目":<36} {"基线均值":>9} {"均值":>9} {"变化":>8} {"基线查询":>8} {"查询":>7}')
+    for name, current, old, change, regressed in rows:
+        if current is None:
+            print(f'{name:<36} {old.get("trimmed", old["p50"]):>9.2f} {"-":>9} {"未运行":>8}')
+        elif old is None:
+            print(f'{name:<36} {"-":>9} {current["trimmed"]:>9.2f} {"新增":>8}')
+        else:
+            mark = ' ⚠️' if regressed else ''
+            print(f'{name:<36} {old.get("trimmed", old["p50"]):>9.2f} {current["trimmed"]:>9.2f} {change:>+8.1%} '
+                  f'{old["queries"]:>8.1f} {current["queries"]:>7.1f}{mark}')
+
+def main():
+    args = parse_args()
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='purecho-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, 'bench.db')
+    if os.path.exists(db_path):
+        print(f'❌ {db_path} 已存在，请指定空目录')
+        sys.exit(1)
+
+    # 必须在导入应用之前设置，Config 在导入时读取环境变量
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    os.environ['CONTENT_VERSION_FILE'] = os.path.join(workdir, 'content_version')
+    # 保存文章后的后台任务在请求中执行，写入的耗时包含全部后续工作，结果不受工作线程干扰
+    os.environ['TASKS_SYNC'] = 'true'
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from app import app
+    import backup
+    from init_db import init_database
+    from bench.corpus import generate_corpus
+    from bench.runner import (QueryCounter, sample, peak_memory, summarize, route_cases, write_cases, function_cases,
+                              uncovered_endpoints, compare)
+
+    params = {key: getattr(args, key) for key in
+              ('posts', 'tags', 'tags_per_post', 'pages', 'paragraphs', 'code_blocks', 'seed')}
+    params['cjk_ratio'] = args.cjk
+    cwd = os.getcwd()
+    os.chdir(workdir)  # 备份函数把文件写入当前目录的 backups/
+    try:
+        print(f'📝 正在生成测试数据：{args.posts} 篇文章，{args.tags} 个标签，随机种子 {args.seed}')
+        start = datetime.now()
+        with redirect_stdout(io.StringIO()):
+            init_database()
+        with app.app_context():
+            generate_corpus(**params)
+        # 导出、导入使用 backup.py 自己的应用
+        counter = QueryCounter([app, backup.app])
+        print(f'⏱️  生成用时 {(datetime.now() - start).total_seconds():.1f} 秒')
+
+        app.config['RESPONSE_CACHE_ENABLED'] = args.cache
+        client = app.test_client()
+        admin_client = app.test_client()
+        with admin_client.session_transaction() as session:
+            session['logged_in'] = True
+
+        routes = route_cases(app, client, admin_client) + write_cases(app, admin_client)
+        missing = uncovered_endpoints(app, [url for _, _, url in routes])
+        if missing:
+            print(f'⚠️  未覆盖的路由：{", ".join(missing)}')
+        cases = [(name, fn, args.repeat) for name, fn, _ in routes]
+        cases += [(name, fn, args.backup_repeat if 'data' in name else args.repeat)
+                  for name, fn in function_cases(app, workdir)]
+        if args.only:
+            cases = [case for case in cases if args.only in case[0]]
+
+        rounds = {name: [] for name, _, _ in cases}
+        queries = dict.fromkeys(rounds, 0)
+        for n in range(1, args.rounds + 1):
+            for name, fn, repeat in cases:
+                print(f'  ⏳ [{n}/{args.rounds}] {name:<50}', end='\r', flush=True)
+                with redirect_stdout(io.StringIO()):  # 被测函数的输出
+                    times, count = sample(fn, counter, max(1, -(-repeat // args.rounds)), args.warmup)
+                rounds[name].append(times)
+                queries[name] += count
+        results = {}
+        for name, fn, _ in cases:
+            with redirect_stdout(io.StringIO()):
+                peak = peak_memory(fn)
+            results[name] = summarize(rounds[name], queries[name], peak)
+        print(' ' * 60, end='\r')
+        print_results(results)
+    finally:
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'response_cache': args.cache,
+            'corpus': params,
+        },
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'📁 结果已保存：{args.save}')
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('corpus') != params or baseline['meta'].get('response_cache') != args.cache:
+            print('⚠️  基线使用的测试数据或缓存设置与本次不同，比较结果仅供参考')
+        rows, regressions = compare(results, baseline, args.threshold, args.min_delta)
+        print(f'\n📊 与基线比较（{args.baseline}，{baseline["meta"].get("created_at")}）：')
+        print_comparison(rows)
+        if regressions:
+            print(f'❌ {len(regressions)} 项退化：{", ".join(regressions)}')
+            sys.exit(1)
+        print('✅ 没有退化')
+
+if __name__ == '__main__':
+    main()
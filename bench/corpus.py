@@ -0,0 +1,100 @@
+"""生成可重复的测试数据：相同的参数和随机种子得到完全相同的数据库内容"""
+
+import random
+from datetime import datetime, timedelta
+
+from models import db, Post, Tag, post_tags
+from render import render_markdown, content_hash, summarize
+from tag_service import refresh_tag_counts
+from archive import refresh_archive
+from related import rebuild_related
+from search import rebuild_index
+
+# 固定的起始时间，保证生成的数据与运行时间无关
+BASE_TIME = datetime(2024, 1, 1, 8, 0, 0)
+
+_CJK = ('的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行'
+        '学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政'
+        '四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代')
+_WORDS = ('python flask sqlite cache index query render markdown server request response template static stream batch '
+          'memory latency worker session engine cursor backup import export search token feed sitemap archive').split()
+
+CODE_SNIPPET = '''```python
+def fibonacci(n):
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+```'''
+
+def _sentence(rng, cjk_ratio):
+    if rng.random() < cjk_ratio:
+        return ''.join(rng.choice(_CJK) for _ in range(rng.randint(12, 40))) + '。'
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(6, 18))]
+    return ' '.join(words).capitalize() + '.'
+
+def make_content(rng, paragraphs=8, code_blocks=1, cjk_ratio=0.5):
+    """生成一篇 markdown 正文：标题、段落、列表、链接、表格和代码块"""
+    blocks = [f'## {_sentence(rng, cjk_ratio)[:20]}']
+    for i in range(paragraphs):
+        blocks.append(' '.join(_sentence(rng, cjk_ratio) for _ in range(rng.randint(2, 6))))
+        if i == 1:
+            blocks.append('\n'.join(f'- **{rng.choice(_WORDS)}** {_sentence(rng, cjk_ratio)}' for _ in range(3)))
+        if i == 2:
+            blocks.append(f'[{rng.choice(_WORDS)}](https://example.com/{rng.choice(_WORDS)}) '
+                          f'`{rng.choice(_WORDS)}()` {_sentence(rng, cjk_ratio)}')
+        if i == 3:
+            blocks.append('| 名称 | 数值 |\n| --- | --- |\n' +
+                          '\n'.join(f'| {rng.choice(_WORDS)} | {rng.randint(1, 1000)} |' for _ in range(3)))
+    for _ in range(code_blocks):
+        blocks.insert(rng.randint(1, len(blocks)), CODE_SNIPPET)
+    return '\n\n'.join(blocks)
+
+def generate_corpus(posts=1000, tags=200, tags_per_post=3, pages=3, paragraphs=8, code_blocks=1,
+                    cjk_ratio=0.5, seed=42, batch_size=500):
+    """向当前数据库写入测试数据（需在应用上下文中调用，数据库应为空），返回统计信息
+
+    正文在写入时渲染，基准测试测的是正常运行时的读取路径，而不是首次访问时的渲染。
+    """
+    rng = random.Random(seed)
+    tag_names = [f'{rng.choice(_WORDS)}-{i}' if i % 2 else f'标签{i}' for i in range(tags)]
+    db.session.execute(db.insert(Tag), [{'name': name} for name in tag_names])
+    tag_ids = dict(db.session.query(Tag.name, Tag.id))
+
+    total = posts + pages
+    for start in range(0, total, batch_size):
+        rows, links = [], []
+        for i in range(start, min(start + batch_size, total)):
+            is_page = i >= posts
+            content = make_content(rng, paragraphs, code_blocks, cjk_ratio)
+            created_at = BASE_TIME + timedelta(hours=i)
+            html = render_markdown(content)
+            excerpt, word_count = summarize(html)
+            rows.append({
+                'id': i + 1,
+                'title': _sentence(rng, cjk_ratio)[:30],
+                'content': content,
+                'content_html': html,
+                'content_hash': content_hash(content),
+                'excerpt': excerpt,
+                'word_count': word_count,
+                'created_at': created_at,
+                'updated_at': created_at + timedelta(minutes=rng.randint(0, 600)),
+                'is_page': is_page,
+                'slug': f'page-{i - posts}' if is_page else f'post-{i}',
+            })
+            if not is_page:
+                # 标签使用频率不均匀，少数标签下文章很多
+                for name in set(rng.choices(tag_names, weights=[1 / (n + 1) for n in range(tags)], k=tags_per_post)):
+                    links.append({'post_id': i + 1, 'tag_id': tag_ids[name]})
+        db.session.execute(db.insert(Post), rows)
+        if links:
+            db.session.execute(post_tags.insert(), links)
+        db.session.commit()
+
+    refresh_tag_counts()
+    refresh_archive()
+    rebuild_related(workers=1)
+    db.session.commit()
+    rebuild_index()
+    return {'posts': posts, 'pages': pages, 'tags': tags}
@@ -0,0 +1,290 @@
+"""执行基准测试：计时、统计 SQL 查询数和内存峰值，并与基线结果比较"""
+
+import gc
+import os
+import time
+import tracemalloc
+from datetime import datetime
+
+from sqlalchemy import event, func
+
+# 不测的路由：静态文件由 nginx 提供，登录和修改密码的耗时主要是有意放慢的密码哈希，导入由 import_data 代表，
+# 测试数据没有历史版本
+SKIPPED_ENDPOINTS = {'static', 'login', 'change_password', 'admin_import', 'admin_revision'}
+
+class QueryCounter:
+    """统计各应用所有数据库引擎执行的 SQL 语句数
+
+    backup.py 等命令行工具创建自己的应用和引擎，需要一起传入，否则它们执行的查询不会计入。
+    """
+
+    def __init__(self, apps):
+        from models import db
+
+        self.count = 0
+        for app in apps:
+            with app.app_context():
+                for engine in db.engines.values():
+                    event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args, **kwargs):
+        self.count += 1
+
+def trimmed_mean(values, proportion=0.2):
+    """去掉最快和最慢的各 proportion 后取平均，比较基线时不受个别偶发的慢请求影响"""
+    ordered = sorted(values)
+    cut = int(len(ordered) * proportion)
+    kept = ordered[cut:len(ordered) - cut] or ordered
+    return sum(kept) / len(kept)
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+def sample(fn, counter, repeat=20, warmup=2):
+    """先预热，再计时 repeat 次，返回每次耗时（毫秒）和查询总数
+
+    fn.setup 存在时在每次调用前执行，不计入耗时和查询数。计时期间关闭垃圾回收，
+    否则上一项留下的对象可能在任意一次调用中触发回收，使耗时忽高忽低。
+    """
+    setup = getattr(fn, 'setup', None)
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    times = []
+    queries = 0
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            if setup:
+                setup()
+            start_count = counter.count
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) * 1000)
+            queries += counter.count - start_count
+    finally:
+        gc.enable()
+    return times, queries
+
+def peak_memory(fn):
+    """用 tracemalloc 单独调用一次测内存峰值（KB），避免影响计时"""
+    setup = getattr(fn, 'setup', None)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak // 1024
+
+def summarize(rounds, queries, peak_kb):
+    """汇总多轮计时结果
+
+    trimmed 取各轮截尾均值中最小的一轮：各项按轮交替计时，机器短暂繁忙时
+    只会拖慢某一项的某一轮，取最小值可以排除这类干扰。
+    """
+    times = [t for round_times in rounds for t in round_times]
+    return {
+        'repeat': len(times),
+        'mean': round(sum(times) / len(times), 3),
+        'min': round(min(times), 3),
+        'trimmed': round(min(trimmed_mean(round_times) for round_times in rounds), 3),
+        'p50': round(percentile(times, 50), 3),
+        'p90': round(percentile(times, 90), 3),
+        'p99': round(percentile(times, 99), 3),
+        'queries': round(queries / len(times), 1),
+        'peak_kb': peak_kb,
+    }
+
+def _get(client, url):
+    def fn():
+        response = client.get(url)
+        response.get_data()  # 流式响应在读取时才生成
+        if response.status_code >= 400:
+            raise RuntimeError(f'{url} 返回 {response.status_code}')
+    return fn
+
+def route_cases(app, client, admin_client):
+    """(名称, 函数, URL) 列表，覆盖 app.py 中除 SKIPPED_ENDPOINTS 外的所有 GET 路由"""
+    from models import db, Post, Tag, ArchiveMonth
+    from pagination import encode_cursor
+    from sitemap import sitemap_chunks, count_urls
+
+    with app.app_context():
+        post = Post.query.filter_by(is_page=False).order_by(Post.id).offset(
+            Post.query.filter_by(is_page=False).count() // 2).first()
+        page = Post.query.filter_by(is_page=True).first()
+        tag = Tag.query.order_by(Tag.post_count.desc(), Tag.id).first()
+        boundary = (db.session.query(Post.created_at, Post.id).filter(Post.is_page == False)
+                    .order_by(Post.created_at.desc(), Post.id.desc()).offset(49).first())
+        chunks = sitemap_chunks()
+        total_urls = sum(count_urls())
+        month = ArchiveMonth.query.order_by(ArchiveMonth.post_count.desc()).first()
+        cjk_word = (db.session.query(func.substr(Post.title, 1, 2)).filter(Post.title.op('GLOB')('[^A-Za-z]*'))
+                    .order_by(Post.id).limit(1).scalar()) or '标签'
+
+    # (名称, URL, 客户端)：名称不含具体的 slug 和游标，便于与基线比较
+    cases = [('GET /', '/', client), ('GET /page/<int>', '/page/5', client), ('GET /tags', '/tags', client),
+             ('GET /feed.xml', '/feed.xml', client), ('GET /atom.xml', '/atom.xml', client),
+             ('GET /feed.json', '/feed.json', client), ('GET /sitemap.xml', '/sitemap.xml', client),
+             ('GET /archive', '/archive', client),
+             ('GET /search (中文)', f'/search?q={cjk_word}', client),
+             ('GET /search (英文)', '/search?q=flask+cache', client),
+             ('GET /admin', '/admin', admin_client), ('GET /admin/password', '/admin/password', admin_client),
+             ('GET /admin/write', '/admin/write', admin_client), ('GET /admin/posts', '/admin/posts', admin_client),
+             ('GET /admin/pages', '/admin/pages', admin_client), ('GET /admin/cache', '/admin/cache', admin_client),
+             ('GET /admin/tasks', '/admin/tasks', admin_client),
+             ('GET /api/tags', '/api/tags', admin_client), ('GET /admin/metrics', '/admin/metrics', admin_client),
+             ('GET /admin/slow-queries', '/admin/slow-queries', admin_client),
+             ('GET /admin/export (ndjson.gz)', '/admin/export?format=ndjson&gzip=1', admin_client)]
+    if boundary is not None:
+        cases.append(('GET /?after=<cursor>', f'/?after={encode_cursor(*boundary)}', client))
+    if post is not None:
+        cases += [('GET /post/<slug>', f'/post/{post.slug}', client), ('GET /edit/<id>', f'/edit/{post.id}', admin_client),
+                  ('GET /admin/revisions/<id>', f'/admin/revisions/{post.id}', admin_client)]
+    if month is not None:
+        cases += [('GET /archive/<year>', f'/archive/{month.year}', client),
+                  ('GET /archive/<year>/<month>', f'/archive/{month.year}/{month.month}', client)]
+    if page is not None:
+        cases.append(('GET /page/<slug>', f'/page/{page.slug}', client))
+    if tag is not None:
+        cases += [('GET /tag/<name>', f'/tag/{tag.name}', client),
+                  ('GET /tag/<name>/page/<int>', f'/tag/{tag.name}/page/2', client)]
+    routes = [(name, _get(c, url), url) for name, url, c in cases]
+    # 测试数据不超过一个 sitemap 的 URL 上限时没有分片，测量时临时调小上限，第 1 个分片约含一半的 URL
+    fn = _get(client, '/sitemap-1.xml')
+    if chunks == 1:
+        fn = _with_max_urls(fn, (1 + total_urls) // 2 + 1)
+    routes.append(('GET /sitemap-<int>.xml', fn, '/sitemap-1.xml'))
+    return routes
+
+def _with_max_urls(fn, max_urls):
+    import sitemap
+
+    def run():
+        original, sitemap.MAX_URLS_PER_SITEMAP = sitemap.MAX_URLS_PER_SITEMAP, max_urls
+        try:
+            fn()
+        finally:
+            sitemap.MAX_URLS_PER_SITEMAP = original
+    return run
+
+def write_cases(app, admin_client):
+    """发表、修改、删除文章；删除的是本轮发表的文章，数据库回到测试前的文章数"""
+    from models import Post
+
+    created = []
+    state = {'n': 0, 'edit': 0}
+    with app.app_context():
+        edit_id = Post.query.filter_by(is_page=False).order_by(Post.id.desc()).first().id
+
+    def write():
+        state['n'] += 1
+        slug = f'bench-write-{state["n"]}'
+        admin_client.post('/admin/write', data={'title': f'基准测试 {state["n"]}', 'content': '正文 **内容**\n\n- 一\n- 二',
+                                                 'tags': 'bench, 基准', 'slug': slug})
+        with app.app_context():
+            created.append(Post.query.filter_by(slug=slug).first().id)
+
+    def edit():
+        state['edit'] += 1
+        admin_client.post(f'/edit/{edit_id}', data={'title': '修改后的标题', 'content': f'修改后的正文 {state["edit"]}',
+                                                    'tags': 'bench, 修改'})
+
+    def delete():
+        admin_client.get(f'/delete/{created.pop()}')
+
+    # 单独运行删除时先发表要删除的文章
+    delete.setup = lambda: created or write()
+
+    return [('POST /admin/write', write, '/admin/write'), ('POST /edit/<id>', edit, f'/edit/{edit_id}'),
+            ('GET /delete/<id>', delete, f'/delete/{edit_id}')]
+
+def function_cases(app, workdir):
+    """feed、sitemap 生成函数、相关文章的计算和备份导出导入（文件写入 workdir/backups）"""
+    from config import Config
+    from models import db, Post
+    from feed import generate_feed
+    from sitemap import generate_sitemap
+    from backup import export_data, import_data
+    from related import rebuild_related
+
+    config = Config()
+
+    def feed(fmt):
+        def fn():
+            with app.test_request_context():
+                posts = (Post.query.filter_by(is_page=False).order_by(Post.created_at.desc())
+                         .limit(config.FEED_ENTRY_COUNT).all())
+                generate_feed(posts, config, fmt)
+        return fn
+
+    def sitemap():
+        with app.test_request_context():
+            for _ in generate_sitemap(config, datetime.now()):
+                pass
+
+    def related():
+        with app.app_context():
+            rebuild_related(workers=1)
+            db.session.commit()
+
+    def checked(fn, *args, **kwargs):
+        def run():
+            if not fn(*args, **kwargs):
+                raise RuntimeError(f'{fn.__name__} 失败')
+        return run
+
+    export_path = os.path.join(workdir, 'backups', 'bench_export.json.gz')
+    return [
+        ('generate_feed(rss)', feed('rss')),
+        ('generate_feed(atom)', feed('atom')),
+        ('generate_feed(json)', feed('json')),
+        ('generate_sitemap', sitemap),
+        ('rebuild_related', related),
+        ('export_data(json.gz)', checked(export_data, os.path.basename(export_path), 'json', True)),
+        # 覆盖导入会清空渲染缓存，放在最后
+        ('import_data(update)', checked(import_data, export_path, force=True, conflict='update')),
+    ]
+
+def uncovered_endpoints(app, urls):
+    """没有被基准测试覆盖的 GET 路由"""
+    adapter = app.url_map.bind('localhost')
+    covered = {adapter.match(url.split('?', 1)[0])[0] for url in urls}
+    return sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                  if 'GET' in rule.methods and rule.endpoint not in covered | SKIPPED_ENDPOINTS)
+
+def compare(results, baseline, threshold=0.5, min_delta=1.0):
+    """与基线比较，返回 [(名称, 本次, 基线, 变化比例, 是否退化)] 和退化的项目名
+
+    截尾均值和 p50 都变慢超过 threshold 且超过 min_delta 毫秒，或查询数增加，视为退化。
+    同一份代码两次运行时单项耗时可能相差 40% 以上，只看一个统计量或只看比例
+    （不到 1 毫秒的路由）都会误报；真正的退化会使两者同时变慢。
+    """
+    rows, regressions = [], []
+    old_results = baseline.get('results', {})
+    for name, current in results.items():
+        old = old_results.get(name)
+        if old is None:
+            rows.append((name, current, None, None, False))
+            continue
+        old_time = old.get('trimmed', old['p50'])  # 旧版本保存的基线没有截尾均值
+        delta = current['trimmed'] - old_time
+        change = delta / old_time if old_time else 0.0
+        p50_delta = current['p50'] - old['p50']
+        p50_change = p50_delta / old['p50'] if old['p50'] else 0.0
+        slower = min(change, p50_change) > threshold and min(delta, p50_delta) > min_delta
+        regressed = slower or current['queries'] > old['queries']
+        if regressed:
+            regressions.append(name)
+        rows.append((name, current, old, change, regressed))
+    for name in old_results:
+        if name not in results:
+            rows.append((name, None, old_results[name], None, False))
+    return rows, regressions
@@ -0,0 +1,189 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, Response
+from werkzeug.http import is_resource_modified
+
+from models import CHINA_TZ
+
+# 缓存响应时不保存的响应头
+_SKIPPED_HEADERS = {'content-length', 'date', 'set-cookie', 'etag', 'last-modified'}
+
+def to_aware(dt):
+    """数据库中的时间以北京时间无时区形式保存，转换为带时区的时间"""
+    if dt is None:
+        return None
+    return dt.replace(tzinfo=CHINA_TZ) if dt.tzinfo is None else dt
+
+# ---- 全站内容版本 ----
+# 版本号保存在文件中，多个 gunicorn worker 和命令行工具可以共享
+
+_version_lock = threading.Lock()
+_version_state = {}  # 路径 -> (mtime_ns, version, changed_at)
+
+def _version_path():
+    return current_app.config['CONTENT_VERSION_FILE']
+
+def bump_content_version():
+    """内容发生变化时调用，使所有缓存的响应失效"""
+    path = _version_path()
+    version = str(time.time_ns())
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+def content_version():
+    """返回 (版本号, 最后修改时间)"""
+    path = _version_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        bump_content_version()
+        mtime = os.stat(path).st_mtime_ns
+
+    with _version_lock:
+        state = _version_state.get(path)
+        if state is None or state[0] != mtime:
+            with open(path) as f:
+                version = f.read().strip() or '0'
+            try:
+                changed_at = datetime.fromtimestamp(int(version) / 1e9, timezone.utc)
+            except ValueError:
+                changed_at = datetime.fromtimestamp(mtime / 1e9, timezone.utc)
+            state = (mtime, version, changed_at.replace(microsecond=0))
+            _version_state[path] = state
+    return state[1], state[2]
+
+# ---- 响应缓存 ----
+
+class CachedResponse:
+    def __init__(self, body, status, headers, etag, last_modified):
+        self.body = body  # 流式响应不缓存正文，为 None
+        self.status = status
+        self.headers = headers
+        self.etag = etag
+        self.last_modified = last_modified
+
+class ResponseCache:
+    """进程内的整页响应缓存，按路由和参数缓存，内容版本变化时整体失效"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+    def get(self, key, version):
+        with self._lock:
+            if self._version != version:
+                self._entries.clear()
+                self._version = version
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, version, entry):
+        with self._lock:
+            if self._version != version:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        with self._lock:
+            total = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats,
+                        entries=len(self._entries),
+                        max_entries=self.max_entries,
+                        hit_rate=self.stats['hits'] / total if total else 0.0)
+
+response_cache = ResponseCache()
+
+def _cache_key(kwargs):
+    return (request.endpoint,
+            tuple(sorted(kwargs.items())),
+            tuple(sorted(request.args.items(multi=True))),
+            datetime.now().year)  # 页脚显示当前年份
+
+def _not_modified(entry):
+    response = Response(status=304)
+    _apply_validators(response, entry)
+    return response
+
+def _apply_validators(response, entry):
+    # 同一页面可能压缩或不压缩发送，使用弱 ETag，200 与 304 响应的 ETag 相同
+    response.set_etag(entry.etag, weak=True)
+    response.last_modified = entry.last_modified
+    response.cache_control.no_cache = True
+    response.cache_control.public = True
+
+def cached_response(view):
+    """缓存公开页面的完整响应，并支持 ETag / Last-Modified 条件请求（If-None-Match 按弱比较）
+
+    视图可以设置 response.last_modified，未设置时使用全站内容的最后修改时间。
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config['RESPONSE_CACHE_ENABLED']:
+            return view(*args, **kwargs)
+
+        version, changed_at = content_version()
+        key = _cache_key(kwargs)
+        entry = response_cache.get(key, version)
+
+        if entry is not None:
+            response_cache.record('hits')
+            if not is_resource_modified(request.environ, etag=entry.etag, last_modified=entry.last_modified):
+                response_cache.record('not_modified')
+                return _not_modified(entry)
+            if entry.body is not None:
+                response = Response(entry.body, status=entry.status, headers=entry.headers)
+                _apply_validators(response, entry)
+                return response
+            # 流式响应只缓存校验信息，正文重新生成
+            response = make_response(view(*args, **kwargs))
+            _apply_validators(response, entry)
+            return response
+
+        response_cache.record('misses')
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or 'Set-Cookie' in response.headers:
+            return response
+
+        last_modified = response.last_modified or changed_at
+        if response.is_streamed:
+            body = None
+            etag = hashlib.sha256(f'{version}:{key}'.encode('utf-8')).hexdigest()
+        else:
+            body = response.get_data()
+            etag = hashlib.sha256(body).hexdigest()
+        headers = [(k, v) for k, v in response.headers if k.lower() not in _SKIPPED_HEADERS]
+        entry = CachedResponse(body, response.status_code, headers, etag, last_modified)
+        response_cache.set(key, version, entry)
+
+        _apply_validators(response, entry)
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            response_cache.record('not_modified')
+            return _not_modified(entry)
+        return response
+    return wrapper
@@ -0,0 +1,164 @@
+import zlib
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，未安装时只使用 gzip
+    zstandard = None
+
+# 需要压缩的内容类型
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/xml', 'text/javascript',
+    'application/json', 'application/xml', 'application/javascript', 'image/svg+xml',
+    'application/rss+xml', 'application/atom+xml', 'application/feed+json',
+}
+
+class CompressionCache:
+    """进程内的压缩结果缓存，按 (ETag, 编码) 保存，总大小超过 max_bytes 时淘汰最久未使用的"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return body
+
+    def set(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def info(self):
+        with self._lock:
+            total = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats,
+                        entries=len(self._entries),
+                        size=self._size,
+                        max_bytes=self.max_bytes,
+                        hit_rate=self.stats['hits'] / total if total else 0.0)
+
+compression_cache = CompressionCache()
+
+def _compressor(encoding, level):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    return zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 输出 gzip 格式
+
+def compress(data, encoding, level):
+    compressor = _compressor(encoding, level)
+    return compressor.compress(data) + compressor.flush()
+
+def choose_encoding(accept_encodings, encodings):
+    """按 Accept-Encoding 的权重选择编码，权重相同时按 encodings 的顺序；都不接受时返回 None"""
+    best, best_quality = None, 0
+    for encoding in encodings:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def _compress_stream(iterable, encoding, level, key):
+    """边生成边压缩；完整生成后把压缩结果存入缓存"""
+    compressor = _compressor(encoding, level)
+    parts = [] if key is not None else None
+    try:
+        for chunk in iterable:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk)
+            if data:
+                if parts is not None:
+                    parts.append(data)
+                yield data
+        data = compressor.flush()
+        if parts is not None:
+            parts.append(data)
+            compression_cache.set(key, b''.join(parts))
+        yield data
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+def _compressible(response):
+    return (response.status_code == 200
+            and not response.direct_passthrough  # send_file 发送的文件，静态资源另有预压缩的文件
+            and 'Content-Encoding' not in response.headers
+            and 'Content-Range' not in response.headers
+            and not response.cache_control.no_transform
+            and response.mimetype in COMPRESSIBLE_TYPES)
+
+def init_compression(app):
+    """按 Accept-Encoding 压缩响应（gzip，安装了 zstandard 时优先 zstd）
+
+    小于 COMPRESS_MIN_SIZE 的响应不压缩。cached_response 生成的 ETag 由内容计算，压缩结果按 ETag 缓存，
+    同一页面再次请求时直接使用；其他带强 ETag 的响应压缩后 ETag 改为弱 ETag。
+    """
+    compression_cache.max_bytes = app.config['COMPRESS_CACHE_BYTES']
+    encodings = ('zstd', 'gzip') if zstandard is not None and app.config['COMPRESS_ZSTD'] else ('gzip',)
+    levels = {'gzip': app.config['COMPRESS_LEVEL'], 'zstd': app.config['COMPRESS_ZSTD_LEVEL']}
+    min_size = app.config['COMPRESS_MIN_SIZE']
+
+    @app.after_request
+    def compress_response(response):
+        if not _compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings, encodings)
+        if encoding is None:
+            return response
+
+        etag, weak = response.get_etag()
+        key = (etag, encoding) if etag else None
+        if response.is_streamed:
+            body = compression_cache.get(key) if key is not None else None
+            if body is None:
+                response.response = _compress_stream(response.response, encoding, levels[encoding], key)
+                response.headers.pop('Content-Length', None)
+            else:
+                # 不再读取原来的生成器，响应结束时关闭（stream_with_context 需要在请求上下文之外关闭）
+                if hasattr(response.response, 'close'):
+                    response.call_on_close(response.response.close)
+                response.set_data(body)
+        else:
+            if response.content_length is not None and response.content_length < min_size:
+                return response
+            body = compression_cache.get(key) if key is not None else None
+            if body is None:
+                data = response.get_data()
+                if len(data) < min_size:
+                    return response
+                body = compress(data, encoding, levels[encoding])
+                if key is not None:
+                    compression_cache.set(key, body)
+            response.set_data(body)
+
+        response.headers['Content-Encoding'] = encoding
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
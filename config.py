@@ -1,10 +1,29 @@
 import os
 
+basedir = os.path.abspath(os.path.dirname(__file__))
+
 class Config:
+    # 应用配置
+    APP_EXTENSIONS = [name.strip() for name in os.environ.get('APP_EXTENSIONS', 'metrics,slow_queries,compression').split(',') if name.strip()]  # 网站启动时加载的功能：metrics（请求统计）、slow_queries（慢查询日志）、compression（响应压缩）
+    
     # 数据库配置
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'blog.db')
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'blog.db'))  # 基准测试等场景可指定其他数据库
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # SQLite 连接设置，每个连接建立时执行对应的 PRAGMA
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')  # WAL 模式下保存文章不会阻塞读取
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')  # WAL 模式下 NORMAL 已能保证数据库不损坏
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # 内存映射读取的字节数，0 为关闭
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))  # 每个连接的页缓存，负数单位为 KiB
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # 数据库被锁定时等待的毫秒数
+    
+    # 连接池设置（每个 gunicorn worker 一个连接池），公开页面的查询使用只读连接（在 create_app 中按数据库地址生成）
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+    
     # 应用配置
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-please-change-in-production'
     
@@ -12,6 +31,68 @@ class Config:
     SITE_TITLE = os.environ.get('SITE_TITLE', "PurEcho")  # 从环境变量获取博客名，默认为PurEcho
     SITE_DESCRIPTION = os.environ.get('SITE_DESCRIPTION', "A simple blog powered by Flask")  # 从环境变量获取博客描述
     SITE_URL = os.environ.get('SITE_URL', 'http://localhost:5000')  # 从环境变量获取站点URL，默认为localhost
+    FEED_ENTRY_COUNT = int(os.environ.get('FEED_ENTRY_COUNT', 10))  # 订阅中包含的文章数
+    FEED_FULL_TEXT = os.environ.get('FEED_FULL_TEXT', 'true').lower() == 'true'  # 输出全文，设为false只输出摘要
+    FEED_SUMMARY_LENGTH = int(os.environ.get('FEED_SUMMARY_LENGTH', 200))  # 摘要字数
+    READING_SPEED = int(os.environ.get('READING_SPEED', 400))  # 首页估算阅读时间用的每分钟字数
     
     # Favicon配置
-    FAVICON_URL = os.environ.get('FAVICON_URL', 'https://media.235421.xyz/favicon.ico')  # 从环境变量获取favicon URL
\ No newline at end of file
+    FAVICON_URL = os.environ.get('FAVICON_URL', 'https://media.235421.xyz/favicon.ico')  # 从环境变量获取favicon URL
+    
+    # 响应缓存配置
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))  # 每个worker最多缓存的页面数
+    CONTENT_VERSION_FILE = os.environ.get('CONTENT_VERSION_FILE', os.path.join(basedir, 'content_version'))  # 全站内容版本文件，保存后更新
+    
+    # 全文搜索配置
+    SEARCH_TOKENIZER = os.environ.get('SEARCH_TOKENIZER', 'cjk')  # cjk（中文按二元组切分）、unicode61 或 trigram，修改后需运行 python backup.py reindex
+    
+    # 备份配置
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))  # 导入时每批写入并提交的文章数
+    SNAPSHOT_KEEP = int(os.environ.get('SNAPSHOT_KEEP', 7))  # backups/ 中保留的数据库快照数量
+    
+    # 静态页面配置
+    FREEZE_OUTPUT_DIR = os.environ.get('FREEZE_OUTPUT_DIR', os.path.join(basedir, 'build'))  # python freeze.py 的输出目录
+    FREEZE_ON_SAVE = os.environ.get('FREEZE_ON_SAVE', 'false').lower() == 'true'  # 保存、删除文章后增量更新静态页面
+    FREEZE_WORKERS = int(os.environ.get('FREEZE_WORKERS', 0))  # 全部重新生成时的进程数，0 为 CPU 核数
+    
+    # 静态资源配置
+    ASSET_FINGERPRINT = os.environ.get('ASSET_FINGERPRINT', 'true').lower() == 'true'  # CSS、JS 使用 static/dist/ 中压缩后带哈希的文件
+    ASSET_BUILD_ON_START = os.environ.get('ASSET_BUILD_ON_START', 'true').lower() == 'true'  # 启动时发现源文件有修改则重新生成
+    ASSET_MAX_AGE = int(os.environ.get('ASSET_MAX_AGE', 365 * 24 * 3600))  # 带哈希的文件的缓存秒数
+
+    # 响应压缩配置（APP_EXTENSIONS 包含 compression 时生效）
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))  # 小于这个字节数的响应不压缩
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))  # gzip 压缩级别 1~9
+    COMPRESS_ZSTD = os.environ.get('COMPRESS_ZSTD', 'true').lower() == 'true'  # 安装了 zstandard 且浏览器支持时使用 zstd
+    COMPRESS_ZSTD_LEVEL = int(os.environ.get('COMPRESS_ZSTD_LEVEL', 3))
+    COMPRESS_CACHE_BYTES = int(os.environ.get('COMPRESS_CACHE_BYTES', 32 * 1024 * 1024))  # 每个 worker 缓存的压缩结果总字节数
+
+    # 历史版本配置
+    REVISION_KEYFRAME_INTERVAL = int(os.environ.get('REVISION_KEYFRAME_INTERVAL', 20))  # 每隔多少个版本保存一次全文，其余只保存差异
+    REVISION_KEEP = int(os.environ.get('REVISION_KEEP', 100))  # 每篇文章保留的版本数，0 为不限
+
+    # 后台任务配置
+    TASKS_SYNC = os.environ.get('TASKS_SYNC', 'false').lower() == 'true'  # 提交后立即在当前请求中执行，用于测试和调试
+    TASKS_WORKERS = int(os.environ.get('TASKS_WORKERS', 1))  # 每个 worker 进程的任务线程数，0 为不启动，由 python tasks.py 执行
+    TASKS_POLL_INTERVAL = float(os.environ.get('TASKS_POLL_INTERVAL', 5))  # 空闲时检查新任务和重试的间隔秒数
+    TASKS_MAX_ATTEMPTS = int(os.environ.get('TASKS_MAX_ATTEMPTS', 3))  # 最多执行次数，之后标记为失败
+    TASKS_RETRY_DELAY = int(os.environ.get('TASKS_RETRY_DELAY', 30))  # 第一次重试前等待的秒数，之后每次加倍
+    TASKS_TIMEOUT = int(os.environ.get('TASKS_TIMEOUT', 600))  # 执行超过这个秒数视为中断，重新执行
+    TASKS_KEEP_DAYS = int(os.environ.get('TASKS_KEEP_DAYS', 7))  # 已完成任务的记录保留天数
+
+    # 相关文章配置
+    RELATED_POSTS_COUNT = int(os.environ.get('RELATED_POSTS_COUNT', 5))  # 文章页显示的相关文章数，调大后需运行 python backup.py related
+    RELATED_TEXT_WEIGHT = float(os.environ.get('RELATED_TEXT_WEIGHT', 0))  # 0~1，正文 TF-IDF 相似度所占的比例，0 为只按共同标签
+    RELATED_MAX_TAG_POSTS = int(os.environ.get('RELATED_MAX_TAG_POSTS', 500))  # 文章数超过这个值的标签太宽泛，不参与计算
+    RELATED_WORKERS = int(os.environ.get('RELATED_WORKERS', 0))  # 全部重新计算时的进程数，0 为 CPU 核数
+
+    # 性能监控配置
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'  # 统计每个请求的 SQL、模板和 markdown 耗时
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true'  # 在 Server-Timing 响应头中输出耗时
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # 设置后 Prometheus 可用 Authorization: Bearer <token> 抓取 /admin/metrics
+    SLOW_QUERY_ENABLED = os.environ.get('SLOW_QUERY_ENABLED', 'false').lower() == 'true'  # 记录慢查询及其查询计划
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))  # 超过这个毫秒数的 SQL 记为慢查询
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', os.path.join(basedir, 'logs', 'slow_queries.log'))
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES', 1024 * 1024))  # 日志超过这个大小后轮转
+    SLOW_QUERY_LOG_BACKUPS = int(os.environ.get('SLOW_QUERY_LOG_BACKUPS', 5))  # 保留的旧日志文件数
@@ -0,0 +1,171 @@
+import json
+import os
+import zlib
+from datetime import datetime
+
+from sqlalchemy import or_
+
+from models import db, Post, Tag, DeletedPost, ImportedPost, post_tags, CHINA_TZ
+
+EXPORT_VERSION = '1.0'
+
+# 格式 -> (扩展名, MIME 类型)
+EXPORT_FORMATS = {
+    'json': ('.json', 'application/json'),
+    'ndjson': ('.ndjson', 'application/x-ndjson'),
+}
+
+def export_filename(fmt='json', compress=False, now=None):
+    """生成备份文件名，如 backup_20250720_180441.json.gz"""
+    now = now or datetime.now()
+    name = f'backup_{now.strftime("%Y%m%d_%H%M%S")}{EXPORT_FORMATS[fmt][0]}'
+    return name + '.gz' if compress else name
+
+def iter_tags(batch_size=1000):
+    last_id = 0
+    while True:
+        rows = (db.session.query(Tag.id, Tag.name)
+                .filter(Tag.id > last_id).order_by(Tag.id).limit(batch_size).all())
+        if not rows:
+            break
+        for id, name in rows:
+            yield {'id': id, 'name': name}
+        last_id = rows[-1].id
+
+def iter_posts(batch_size=500, since=None):
+    """按 id 分批读取文章，每批的标签用一次查询加载，内存占用与文章总数无关
+
+    since 为 (时间, 最大 id) 时只读取在该时间之后修改或 id 更大的文章（增量备份）。
+    """
+    columns = (Post.id, Post.title, Post.content, Post.created_at, Post.updated_at, Post.is_page, Post.slug)
+    query = db.session.query(*columns)
+    if since is not None:
+        # 导入的文章可能带有较早的修改时间，新增的 id 和导入时覆盖的文章也要包含在内
+        imported = db.session.query(ImportedPost.post_id).filter(ImportedPost.imported_at >= since[0])
+        query = query.filter(or_(Post.updated_at >= since[0], Post.id > since[1], Post.id.in_(imported)))
+    last_id = 0
+    while True:
+        rows = query.filter(Post.id > last_id).order_by(Post.id).limit(batch_size).all()
+        if not rows:
+            break
+        tags = {}
+        for post_id, name in (db.session.query(post_tags.c.post_id, Tag.name)
+                              .join(Tag, Tag.id == post_tags.c.tag_id)
+                              .filter(post_tags.c.post_id.in_([row.id for row in rows]))):
+            tags.setdefault(post_id, []).append(name)
+        for row in rows:
+            yield {
+                'id': row.id,
+                'title': row.title,
+                'content': row.content,
+                'created_at': row.created_at.isoformat(),
+                'updated_at': row.updated_at.isoformat(),
+                'is_page': row.is_page,
+                'slug': row.slug,
+                'tags': tags.get(row.id, []),
+            }
+        last_id = rows[-1].id
+
+def iter_deleted(since, batch_size=1000):
+    """读取 since 之后删除的文章 slug"""
+    last_id = 0
+    while True:
+        rows = (db.session.query(DeletedPost.id, DeletedPost.slug, DeletedPost.deleted_at)
+                .filter(DeletedPost.deleted_at >= since, DeletedPost.id > last_id)
+                .order_by(DeletedPost.id).limit(batch_size).all())
+        if not rows:
+            break
+        for row in rows:
+            yield {'slug': row.slug, 'deleted_at': row.deleted_at.isoformat()}
+        last_id = rows[-1].id
+
+def _sections(since):
+    """(键, NDJSON 类型, 记录) 列表；增量备份不导出标签（文章中已包含标签名），增加删除记录"""
+    if since is None:
+        return [('tags', 'tag', iter_tags()), ('posts', 'post', iter_posts())]
+    # 删除记录在文章之前，恢复时先删除再写入，slug 被删除后又重新使用时结果正确
+    return [('tags', 'tag', iter([])), ('deleted', 'deleted', iter_deleted(since[0])),
+            ('posts', 'post', iter_posts(since=since))]
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+def _json_chunks(header, stats, sections):
+    yield '{\n'
+    for key, value in header.items():
+        yield f'  {_dumps(key)}: {_dumps(value)},\n'
+    # 标签在文章之前，导入时可以边读边处理
+    for key, _, items in sections:
+        yield f'  "{key}": ['
+        count = 0
+        for item in items:
+            yield ('\n    ' if count == 0 else ',\n    ') + _dumps(item)
+            count += 1
+        stats[key] = count
+        yield ('\n  ]' if count else ']') + (',\n' if key != 'posts' else '\n')
+    yield '}\n'
+
+def _ndjson_chunks(header, stats, sections):
+    # 每行一条记录，第一行为文件信息
+    yield _dumps({'type': 'meta', **header}) + '\n'
+    for key, kind, items in sections:
+        count = 0
+        for item in items:
+            yield _dumps({'type': kind, **item}) + '\n'
+            count += 1
+        stats[key] = count
+
+def _encode(chunks, buffer_size):
+    """把文本片段编码为 UTF-8，攒到 buffer_size 再输出，减少小块写入"""
+    buffer, size = [], 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+def _gzip(chunks, level):
+    # wbits=31 输出带 gzip 文件头的数据，可直接用 gunzip 解压
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_stream(fmt='json', compress=False, stats=None, buffer_size=64 * 1024, level=6, since=None, meta=None):
+    """逐块生成导出数据（bytes），可直接作为响应体或写入文件
+
+    fmt 为 json 或 ndjson，compress 为 True 时输出 gzip 压缩数据。
+    since 为 (时间, 最大 id) 时只导出之后的修改和删除，meta 中的字段会写入文件头。
+    生成结束后 stats 中会记录导出的文章数和标签数（增量备份还有删除数）。
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'不支持的导出格式：{fmt}')
+    stats = {} if stats is None else stats
+    header = {'version': EXPORT_VERSION, 'exported_at': datetime.now(CHINA_TZ).replace(tzinfo=None).isoformat(), **(meta or {})}
+    sections = _sections(since)
+    chunks = (_ndjson_chunks if fmt == 'ndjson' else _json_chunks)(header, stats, sections)
+    chunks = _encode(chunks, buffer_size)
+    if compress:
+        chunks = _gzip(chunks, level)
+    return chunks
+
+def write_export(path, fmt='json', compress=False, since=None, meta=None):
+    """导出到文件，先写临时文件再改名，中途失败不会留下不完整的备份；返回统计信息"""
+    stats = {}
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in export_stream(fmt, compress, stats, since=since, meta=meta):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return stats
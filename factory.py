@@ -0,0 +1,76 @@
+import os
+
+from flask import Flask
+from dotenv import load_dotenv
+
+# 加载环境变量，必须在导入 Config 之前
+load_dotenv()
+
+from config import Config
+from models import db, init_engine_profile, READONLY_BIND
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+def _init_metrics(app):
+    from metrics import init_metrics
+    init_metrics(app)
+
+def _init_slow_queries(app):
+    from slowlog import init_slow_query_log
+    init_slow_query_log(app)
+
+def _init_compression(app):
+    from compression import init_compression
+    init_compression(app)
+
+# 可在 APP_EXTENSIONS 中选择加载的功能
+EXTENSIONS = {
+    'metrics': _init_metrics,
+    'slow_queries': _init_slow_queries,
+    'compression': _init_compression,
+}
+
+def create_app(config_class=Config, web=True):
+    """创建 Flask 应用并初始化数据库
+
+    web 为 False 时只初始化数据库，供 backup.py、init_db.py 等命令行工具使用，
+    不加载网站的路由、模板和请求统计；为 True 时按 APP_EXTENSIONS 加载各项功能（路由在 app.py 中注册）。
+    """
+    app = Flask('app', root_path=basedir)
+    app.config.from_object(config_class)
+    # 使用配置文件中的SECRET_KEY
+    app.secret_key = app.config['SECRET_KEY']
+    # 只读连接与默认连接访问同一个数据库，按覆盖后的数据库地址生成
+    app.config['SQLALCHEMY_BINDS'] = {
+        READONLY_BIND: {'url': app.config['SQLALCHEMY_DATABASE_URI'], **app.config['SQLALCHEMY_ENGINE_OPTIONS']},
+        **app.config.get('SQLALCHEMY_BINDS', {}),
+    }
+    db.init_app(app)
+    init_engine_profile(app)
+    if web:
+        from cache import response_cache
+        from assets import init_assets
+        from tasks import task_queue
+        response_cache.max_entries = app.config['RESPONSE_CACHE_SIZE']
+        init_assets(app)
+        task_queue.init_app(app)
+        for name in app.config['APP_EXTENSIONS']:
+            if name not in EXTENSIONS:
+                raise ValueError(f'未知的 APP_EXTENSIONS 项：{name}（可选 {", ".join(EXTENSIONS)}）')
+            EXTENSIONS[name](app)
+    return app
+
+def warm_up(app):
+    """提前导入按需加载的模块并编译模板（gunicorn preload 时在主进程调用，worker fork 后直接使用）"""
+    import feedgen.feed  # noqa: F401
+    from render import render_markdown
+    render_markdown('**warm up**\n\n```\ncode\n```')
+    for name in app.jinja_env.list_templates():
+        if name.endswith('.html'):
+            app.jinja_env.get_template(name)
+
+def dispose_engines(app):
+    """fork 之后调用：子进程不能使用从父进程继承的数据库连接"""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -1,46 +1,135 @@
-from feedgen.feed import FeedGenerator
-from datetime import datetime, timezone, timedelta
+import json
+import re
+import threading
+from html import unescape
+
 from flask import url_for
-import markdown
 
-# 设置中国时区
-CHINA_TZ = timezone(timedelta(hours=8))
+from cache import content_version, to_aware
+from render import render_markdown
+
+# 订阅中的正文与网页的渲染方式不同，使用自己的扩展列表
+FEED_MARKDOWN_EXTENSIONS = ['fenced_code', 'codehilite']
+
+FEED_FORMATS = {
+    'rss': 'application/rss+xml',
+    'atom': 'application/atom+xml',
+    'json': 'application/feed+json',
+}
+
+# 按内容版本缓存的条目，RSS / Atom / JSON Feed 共用，内容变化后才重新渲染
+_entries_lock = threading.Lock()
+_entries_cache = {'key': None, 'entries': None}
+
+def _summary(html, length):
+    text = unescape(re.sub(r'<[^>]+>', '', html))
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text if len(text) <= length else text[:length] + '…'
+
+def build_entries(posts, config):
+    """把文章转换为与输出格式无关的条目"""
+    entries = []
+    for post in posts:
+        if post.is_page:  # 只为文章生成RSS，不包含独立页面
+            continue
+
+        # 处理 markdown（支持 ``` 代码块）
+        html = render_markdown(post.content, FEED_MARKDOWN_EXTENSIONS)
+
+        entries.append({
+            'id': post.id,
+            'title': post.title,
+            'link': f"{config.SITE_URL}{url_for('post', slug=post.slug)}",
+            'html': html if config.FEED_FULL_TEXT else None,
+            'summary': _summary(html, config.FEED_SUMMARY_LENGTH),
+            'published': to_aware(post.created_at),
+            'updated': to_aware(post.updated_at),
+            'tags': [tag.name for tag in post.tags],
+        })
+    return entries
+
+def feed_entries(config):
+    """返回最新文章的条目，同一内容版本内只渲染一次"""
+    from models import Post
+
+    version, _ = content_version()
+    key = (version, config.FEED_ENTRY_COUNT, config.FEED_FULL_TEXT, config.FEED_SUMMARY_LENGTH)
+    with _entries_lock:
+        if _entries_cache['key'] == key:
+            return _entries_cache['entries']
+
+    posts = Post.query.filter_by(is_page=False).order_by(Post.created_at.desc()).limit(config.FEED_ENTRY_COUNT).all()
+    entries = build_entries(posts, config)
+    with _entries_lock:
+        _entries_cache['key'] = key
+        _entries_cache['entries'] = entries
+    return entries
+
+def _feed_generator(entries, config, fmt):
+    from feedgen.feed import FeedGenerator  # feedgen 依赖 lxml，导入较慢，首次生成订阅时才导入
 
-def generate_feed(posts, config):
     fg = FeedGenerator()
+    fg.id(config.SITE_URL)
     fg.title(config.SITE_TITLE)
     fg.description(config.SITE_DESCRIPTION)
     fg.link(href=config.SITE_URL)
     fg.language('zh-CN')
-    
-    for post in posts:
-        if not post.is_page:  # 只为文章生成RSS，不包含独立页面
-            fe = fg.add_entry()
-            fe.title(post.title)
-            fe.link(href=f"{config.SITE_URL}{url_for('post', slug=post.slug)}")
-
-            # 处理 markdown（支持 ``` 代码块）
-            html = markdown.markdown(
-                post.content,
-                extensions=["fenced_code", "codehilite"]
-            )
-
-            # 使用 content:encoded，保证代码块正常显示
-            fe.content(html, type='CDATA')
-
-            fe.pubDate(
-                post.created_at.replace(tzinfo=CHINA_TZ)
-                if post.created_at.tzinfo is None
-                else post.created_at
-            )
-            fe.updated(
-                post.updated_at.replace(tzinfo=timezone.utc)
-                if post.updated_at.tzinfo is None
-                else post.updated_at
-            )
-
-            # 添加标签
-            for tag in post.tags:
-                fe.category(term=tag.name)
-
-    return fg.rss_str(pretty=True)
\ No newline at end of file
+
+    for entry in entries:
+        fe = fg.add_entry(order='append')
+        fe.id(entry['link'])
+        fe.title(entry['title'])
+        fe.link(href=entry['link'])
+
+        if entry['html'] is not None:
+            # RSS 使用 content:encoded，保证代码块正常显示
+            fe.content(entry['html'], type='CDATA' if fmt == 'rss' else 'html')
+        fe.summary(entry['summary'])
+
+        fe.pubDate(entry['published'])
+        fe.updated(entry['updated'])
+
+        # 添加标签
+        for tag in entry['tags']:
+            fe.category(term=tag)
+    return fg
+
+def _json_feed(entries, config):
+    items = []
+    for entry in entries:
+        item = {
+            'id': entry['link'],
+            'url': entry['link'],
+            'title': entry['title'],
+            'summary': entry['summary'],
+            'date_published': entry['published'].isoformat(),
+            'date_modified': entry['updated'].isoformat(),
+            'tags': entry['tags'],
+        }
+        if entry['html'] is not None:
+            item['content_html'] = entry['html']
+        else:
+            item['content_text'] = entry['summary']
+        items.append(item)
+
+    return json.dumps({
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': config.SITE_TITLE,
+        'description': config.SITE_DESCRIPTION,
+        'home_page_url': config.SITE_URL,
+        'feed_url': f"{config.SITE_URL}{url_for('json_feed')}",
+        'language': 'zh-CN',
+        'items': items,
+    }, ensure_ascii=False).encode('utf-8')
+
+def render_feed(entries, config, fmt='rss'):
+    """把条目输出为 rss / atom / json 格式的字节串"""
+    if fmt == 'json':
+        return _json_feed(entries, config)
+    fg = _feed_generator(entries, config, fmt)
+    if fmt == 'atom':
+        return fg.atom_str(pretty=True)
+    return fg.rss_str(pretty=True)
+
+def generate_feed(posts, config, fmt='rss'):
+    return render_feed(build_entries(posts, config), config, fmt)
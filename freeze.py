@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+PurEcho 静态页面生成工具
+把首页、文章、页面、标签、归档、订阅和 sitemap 渲染为静态文件，由 nginx 直接提供
+"""
+
+import os
+import sys
+import re
+import json
+import fcntl
+import hashlib
+import shutil
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from urllib.parse import quote, unquote
+
+# 添加项目路径到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import db, Post, Tag, ArchiveMonth, RelatedPost, post_tags
+from pagination import encode_cursor
+from sitemap import sitemap_chunks
+from factory import dispose_engines
+from snapshot import database_path
+
+MANIFEST_FILE = '.freeze-manifest.json'
+# 锁文件放在数据库所在目录：输出目录由 nginx 直接提供
+LOCK_FILE = '.freeze.lock'
+
+# 冻结后的页面中，游标分页链接改写为页码链接
+_CURSOR_LINK = re.compile(r'href="[^"?]*\?(after|before)=([^"&]+)"')
+
+# 需要按组整体更新、可能出现多余旧文件的路径
+_INDEX_FILE = re.compile(r'^(index\.html|page/\d+/index\.html)$')
+_SITEMAP_FILE = re.compile(r'^sitemap(-\d+)?\.xml$')
+
+_worker_app = None
+
+def lock_path(app):
+    try:
+        directory = os.path.dirname(os.path.abspath(database_path(app.config['SQLALCHEMY_DATABASE_URI'])))
+    except ValueError:
+        directory = app.root_path
+    return os.path.join(directory, LOCK_FILE)
+
+def output_path(url):
+    """把 URL 转换为输出目录中的相对路径，不安全的路径返回 None"""
+    path = unquote(url.split('?', 1)[0]).strip('/')
+    parts = path.split('/') if path else []
+    if any(part in ('', '.', '..') or '\\' in part for part in parts):
+        return None
+    if parts and parts[-1].endswith(('.xml', '.json')):
+        return '/'.join(parts)
+    return '/'.join(parts + ['index.html'])
+
+def _listing_jobs(rows, per_page, first_url, page_url):
+    """为一个分页列表生成 (冻结后的 URL, 请求 URL, 链接改写表)"""
+    pages = max(1, -(-len(rows) // per_page))
+    jobs = []
+    for n in range(1, pages + 1):
+        request_url = first_url if n == 1 else f'{first_url}?after={encode_cursor(*rows[(n - 1) * per_page - 1])}'
+        links = {}
+        if n < pages:
+            links[f'after={encode_cursor(*rows[n * per_page - 1])}'] = page_url(n + 1)
+        if n > 1:
+            links[f'before={encode_cursor(*rows[(n - 1) * per_page])}'] = page_url(n - 1)
+        jobs.append((page_url(n), request_url, links))
+    return jobs
+
+def _index_page_url(n):
+    return '/' if n == 1 else f'/page/{n}'
+
+def index_jobs(per_page):
+    rows = (db.session.query(Post.created_at, Post.id)
+            .filter(Post.is_page == False)
+            .order_by(Post.created_at.desc(), Post.id.desc()).all())
+    return _listing_jobs(rows, per_page, '/', _index_page_url)
+
+def tag_jobs(tag, per_page):
+    rows = (db.session.query(post_tags.c.created_at, post_tags.c.post_id)
+            .join(Post, Post.id == post_tags.c.post_id)
+            .filter(post_tags.c.tag_id == tag.id, Post.is_page == False)
+            .order_by(post_tags.c.created_at.desc(), post_tags.c.post_id.desc()).all())
+    base = f'/tag/{quote(tag.name, safe="")}'
+    return _listing_jobs(rows, per_page, base, lambda n: base if n == 1 else f'{base}/page/{n}')
+
+def post_url(slug, is_page):
+    return f'/{"page" if is_page else "post"}/{quote(slug, safe="")}'
+
+def fixed_jobs():
+    """标签列表、订阅和 sitemap，每次更新都重新生成"""
+    urls = ['/tags', '/feed.xml', '/atom.xml', '/feed.json', '/sitemap.xml']
+    chunks = sitemap_chunks()
+    if chunks > 1:
+        urls += [f'/sitemap-{n}.xml' for n in range(1, chunks + 1)]
+    return [(url, url, {}) for url in urls]
+
+def archive_jobs(years=None):
+    """归档首页以及指定年份（None 为全部）的年、月页面"""
+    urls = ['/archive']
+    for year, month in db.session.query(ArchiveMonth.year, ArchiveMonth.month):
+        if years is None or year in years:
+            urls.append(f'/archive/{year}/{month}')
+            if f'/archive/{year}' not in urls:
+                urls.append(f'/archive/{year}')
+    return [(url, url, {}) for url in urls]
+
+def site_state():
+    """读取决定静态页面内容的文章信息：{id: [slug, 是否页面, 创建时间, 修改时间, 标签, 相关文章]}"""
+    tags = {}
+    for post_id, name in db.session.query(post_tags.c.post_id, Tag.name).join(Tag, Tag.id == post_tags.c.tag_id):
+        tags.setdefault(post_id, []).append(name)
+    related = {}
+    for post_id, related_id in db.session.query(RelatedPost.post_id, RelatedPost.related_id).order_by(RelatedPost.post_id, RelatedPost.rank):
+        related.setdefault(post_id, []).append(str(related_id))
+    return {
+        str(id): [slug, is_page, created_at.isoformat(), updated_at.isoformat(), sorted(tags.get(id, [])), related.get(id, [])]
+        for id, slug, is_page, created_at, updated_at
+        in db.session.query(Post.id, Post.slug, Post.is_page, Post.created_at, Post.updated_at)
+    }
+
+def _rewrite(html, links):
+    def replace(match):
+        url = links.get(f'{match.group(1)}={match.group(2)}')
+        return f'href="{url}"' if url else match.group(0)
+    return _CURSOR_LINK.sub(replace, html)
+
+def _write(output_dir, relpath, data):
+    path = os.path.join(output_dir, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def render_jobs(app, jobs, output_dir, hashes):
+    """渲染并写入文件，内容没有变化的文件不重写；返回 {相对路径: 哈希}"""
+    results = {}
+    client = app.test_client()
+    for url, request_url, links in jobs:
+        relpath = output_path(url)
+        if relpath is None:
+            continue
+        response = client.get(request_url)
+        if response.status_code != 200:
+            continue
+        data = response.get_data()
+        if links:
+            data = _rewrite(data.decode('utf-8'), links).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        if hashes.get(relpath) != digest or not os.path.exists(os.path.join(output_dir, relpath)):
+            _write(output_dir, relpath, data)
+        results[relpath] = digest
+    return results
+
+def _init_worker():
+    dispose_engines(_worker_app)
+
+def _render_chunk(jobs, output_dir, hashes):
+    with _worker_app.app_context():
+        return render_jobs(_worker_app, jobs, output_dir, hashes)
+
+def _render_parallel(app, jobs, output_dir, hashes, workers):
+    global _worker_app
+    _worker_app = app
+    # 同一列表的分页放在一起，每块大小适中，让各进程负载均衡
+    size = max(20, -(-len(jobs) // (workers * 4)))
+    chunks = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+    results = {}
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'),
+                             initializer=_init_worker) as executor:
+        futures = [executor.submit(_render_chunk, chunk, output_dir,
+                                   {output_path(url): hashes.get(output_path(url)) for url, _, _ in chunk})
+                   for chunk in chunks]
+        for future in futures:
+            results.update(future.result())
+    return results
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+def _remove(output_dir, relpaths):
+    for relpath in relpaths:
+        path = os.path.join(output_dir, relpath)
+        if os.path.exists(path):
+            os.remove(path)
+        # 删除空目录
+        parent = os.path.dirname(path)
+        while parent != output_dir.rstrip(os.sep) and os.path.isdir(parent) and not os.listdir(parent):
+            os.rmdir(parent)
+            parent = os.path.dirname(parent)
+
+def _plan(manifest, state, per_page):
+    """比较上次生成时的文章信息，返回需要渲染的任务和所属分组（这些分组中未重新生成的旧文件会被删除）"""
+    old = manifest['posts']
+    # 列表页只和前五项有关，相关文章只影响文章页本身
+    changed = {id for id in state if id not in old or old[id][:5] != state[id][:5]}
+    removed = set(old) - set(state)
+    # 相关文章列表变化，或其中的文章有改动（标题、链接可能变化）的文章
+    touched = {id for id, entry in state.items() if id not in changed and entry[0] is not None
+               and (old[id][5:] != entry[5:] or set(entry[5]) & (changed | removed))}
+    if not changed and not removed and not touched:
+        return [], set(), []
+
+    jobs, groups, stale = [], {'sitemap'}, []
+    tag_names = set()
+    index_full = bool(removed)
+    for id in changed | removed:
+        before, after = old.get(id), state.get(id)
+        for entry in (before, after):
+            if entry is not None:
+                tag_names.update(entry[4])
+        if before is None or after is None or before[1:3] != after[1:3] or before[1] or after[1]:
+            # 新增、删除、改变创建时间或类型会使分页整体移动；页面标题显示在首页导航中
+            index_full = True
+        if before is not None and before[0] is not None and (after is None or after[:2] != before[:2]):
+            stale.append(output_path(post_url(before[0], before[1])))
+        if after is not None and after[0] is not None:
+            jobs.append((post_url(after[0], after[1]), post_url(after[0], after[1]), {}))
+    for id in sorted(touched):
+        slug, is_page = state[id][:2]
+        jobs.append((post_url(slug, is_page), post_url(slug, is_page), {}))
+
+    listing = index_jobs(per_page)
+    if index_full:
+        jobs += listing
+        groups.add('index')
+    else:
+        # 只是修改了文章内容：只更新包含这些文章的首页分页
+        order = [str(id) for _, id in (db.session.query(Post.created_at, Post.id)
+                                       .filter(Post.is_page == False)
+                                       .order_by(Post.created_at.desc(), Post.id.desc()))]
+        pages = {order.index(id) // per_page for id in changed if id in order}
+        jobs += [listing[n] for n in sorted(pages)]
+
+    existing = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(tag_names))} if tag_names else {}
+    for name in tag_names:
+        groups.add(('tag', name))
+        if name in existing:
+            jobs += tag_jobs(existing[name], per_page)
+    # 文章的创建年份：归档中该年的年、月页面整体更新
+    years = {int(entry[2][:4]) for id in changed | removed for entry in (old.get(id), state.get(id)) if entry is not None}
+    groups.update(('archive', year) for year in years)
+    jobs += archive_jobs(years)
+    jobs += fixed_jobs()
+    return jobs, groups, stale
+
+def _in_groups(relpath, groups):
+    if 'index' in groups and _INDEX_FILE.match(relpath):
+        return True
+    if 'sitemap' in groups and _SITEMAP_FILE.match(relpath):
+        return True
+    if relpath.startswith('archive/') and relpath.count('/') >= 2:
+        return ('archive', int(relpath.split('/')[1])) in groups
+    if relpath.startswith('tag/'):
+        name = relpath.split('/')[1]
+        return ('tag', name) in groups
+    return False
+
+def freeze_site(app, output_dir, full=False, workers=None, log=None):
+    """生成静态页面，返回 (渲染的文件数, 删除的文件数)
+
+    默认只重新生成上次之后变化的文章及其所在的首页分页、标签页、订阅和 sitemap，
+    没有上次的记录、full 为 True 或年份变化（页脚显示年份）时全部重新生成。
+    """
+    from app import PER_PAGE
+
+    log = log or (lambda message: None)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(lock_path(app), 'w') as lock:
+        # 多个 worker 同时保存文章时依次生成
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        legacy_lock = os.path.join(output_dir, LOCK_FILE)  # 旧版本放在输出目录中的锁文件
+        if os.path.exists(legacy_lock):
+            os.remove(legacy_lock)
+        with app.app_context():
+            manifest = _load_manifest(output_dir)
+            state = site_state()
+            year = datetime.now().year
+            if manifest is None or manifest.get('year') != year:
+                full = True
+
+            hashes = {} if manifest is None else manifest['files']
+            if full:
+                jobs = index_jobs(PER_PAGE) + [
+                    (post_url(slug, is_page), post_url(slug, is_page), {})
+                    for slug, is_page in db.session.query(Post.slug, Post.is_page).filter(Post.slug.isnot(None))
+                ]
+                for tag in Tag.query.order_by(Tag.name):
+                    jobs += tag_jobs(tag, PER_PAGE)
+                jobs += archive_jobs()
+                jobs += fixed_jobs()
+                stale = []
+                groups = None
+            else:
+                jobs, groups, stale = _plan(manifest, state, PER_PAGE)
+            db.session.remove()
+
+        log(f'需要生成 {len(jobs)} 个文件')
+        workers = workers or os.cpu_count() or 1
+        if full and workers > 1 and len(jobs) > 100:
+            results = _render_parallel(app, jobs, output_dir, hashes, workers)
+        else:
+            with app.app_context():
+                results = render_jobs(app, jobs, output_dir, hashes)
+
+        # 删除不再存在的文件
+        files = dict(hashes)
+        if full:
+            removed = [relpath for relpath in files if relpath not in results]
+        else:
+            removed = [relpath for relpath in files
+                       if relpath not in results and (relpath in stale or _in_groups(relpath, groups))]
+        _remove(output_dir, removed)
+        for relpath in removed:
+            files.pop(relpath, None)
+        files.update(results)
+
+        # 静态资源
+        shutil.copytree(app.static_folder, os.path.join(output_dir, 'static'), dirs_exist_ok=True)
+        _save_manifest(output_dir, {'year': year, 'files': files, 'posts': state})
+    return len(results), len(removed)
+
+def main():
+    parser = argparse.ArgumentParser(description='PurEcho 静态页面生成工具')
+    parser.add_argument('--output', '-o', help='输出目录（默认读取 FREEZE_OUTPUT_DIR）')
+    parser.add_argument('--full', action='store_true', help='全部重新生成')
+    parser.add_argument('--workers', '-w', type=int, help='全部重新生成时使用的进程数（默认为 CPU 核数）')
+    args = parser.parse_args()
+
+    from app import app
+
+    output_dir = os.path.abspath(args.output or app.config['FREEZE_OUTPUT_DIR'])
+    start = datetime.now()
+    try:
+        rendered, removed = freeze_site(app, output_dir, args.full, args.workers or app.config['FREEZE_WORKERS'],
+                                        log=lambda message: print(f'📝 {message}'))
+    except Exception as e:
+        print(f'❌ 生成失败：{str(e)}')
+        sys.exit(1)
+    print(f'✅ 生成完成！更新 {rendered} 个文件，删除 {removed} 个文件，用时 {(datetime.now() - start).total_seconds():.1f} 秒')
+    print(f'📁 输出目录：{output_dir}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""
+gunicorn 配置：gunicorn -c gunicorn.conf.py app:app
+
+主进程先加载应用并预热，worker 从主进程 fork，启动和重启时不必各自导入、编译一遍。
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+def when_ready(server):
+    if preload_app:
+        from app import app
+        from factory import warm_up
+        warm_up(app)
+
+def post_fork(server, worker):
+    # 主进程中可能已经建立的数据库连接不能在 worker 中继续使用
+    if preload_app:
+        from app import app
+        from factory import dispose_engines
+        from tasks import task_queue
+        dispose_engines(app)
+        if not app.config['TASKS_SYNC'] and app.config['TASKS_WORKERS'] > 0:
+            task_queue.start()
@@ -0,0 +1,389 @@
+import gzip
+import io
+import json
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, Post, Tag, DeletedPost, ImportedPost, CHINA_TZ, post_tags
+from render import render_markdown, content_hash, summarize
+from tag_service import refresh_tag_counts, delete_orphan_tags
+from archive import refresh_archive
+from revisions import delete_revisions, save_revision
+from search import index_posts, remove_posts
+from cache import bump_content_version
+from tasks import enqueue
+
+# save_revision 只用到文章的这几个字段
+_Revised = namedtuple('_Revised', 'id title content')
+
+# 遇到已存在的 slug 时：skip 跳过，update 用备份中的内容覆盖
+CONFLICT_MODES = ('skip', 'update')
+
+# 可导入的备份文件扩展名
+IMPORT_EXTENSIONS = ('.json', '.ndjson', '.json.gz', '.ndjson.gz')
+
+# 文件内容无法解析时抛出的异常
+FORMAT_ERRORS = (json.JSONDecodeError, UnicodeDecodeError, EOFError, gzip.BadGzipFile)
+
+READ_SIZE = 64 * 1024
+
+class BackupFormatError(ValueError):
+    """备份文件是有效的 JSON，但缺少字段或结构不对"""
+
+class ImportStats:
+    """导入进度和结果统计"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.deleted = 0
+        self.tags_created = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        """每秒处理的文章数"""
+        elapsed = self.elapsed
+        return self.processed / elapsed if elapsed else 0.0
+
+def open_backup(fileobj):
+    """以文本方式打开备份文件（二进制流），自动识别 gzip 压缩"""
+    magic = fileobj.read(2)
+    fileobj.seek(0)
+    if magic == b'\x1f\x8b':
+        fileobj = gzip.GzipFile(fileobj=fileobj, mode='rb')
+    return io.TextIOWrapper(fileobj, encoding='utf-8')
+
+class _JSONReader:
+    """逐块读取 JSON 文本，用 raw_decode 解析其中的单个值，不把整个文件读入内存"""
+
+    def __init__(self, stream, head=''):
+        self.stream = stream
+        self.buffer = head
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _read(self, size=READ_SIZE):
+        if self.eof:
+            return False
+        chunk = self.stream.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        # 丢弃已解析的部分
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白，返回下一个字符（文件结束时返回空字符串）"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._read():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(f'应为 {chars!r}', self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        size = READ_SIZE
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # 值还没有读完整（如很长的文章），继续读取，每次读取量加倍
+                if not self._read(size):
+                    raise
+                size *= 2
+                continue
+            if end == len(self.buffer) and self._read(size):
+                # 数字等值可能在缓冲区末尾被截断，读到更多内容后重新解析
+                continue
+            self.pos = end
+            return value
+
+# JSON 中的列表 -> 记录类型（deleted 只出现在增量备份中）
+_SECTIONS = {'tags': 'tag', 'posts': 'post', 'deleted': 'deleted'}
+_RECORD_NAMES = {'tag': '标签', 'post': '文章', 'deleted': '删除记录'}
+
+def _iter_json(stream, head):
+    """逐条返回 JSON 备份中的记录，标签和文章可以按任意顺序出现"""
+    reader = _JSONReader(stream, head)
+    reader.expect('{')
+    seen = set()
+    if reader.peek() == '}':
+        reader.pos += 1
+    else:
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            if key in _SECTIONS:
+                seen.add(key)
+                reader.expect('[')
+                if reader.peek() == ']':
+                    reader.pos += 1
+                else:
+                    while True:
+                        yield _SECTIONS[key], reader.value()
+                        if reader.expect(',]') == ']':
+                            break
+            else:
+                yield 'meta', {key: reader.value()}
+            if reader.expect(',}') == '}':
+                break
+    if not {'tags', 'posts'} <= seen:
+        raise BackupFormatError('文件格式错误：缺少必要的数据字段')
+
+def iter_records(stream):
+    """逐条返回备份中的记录，自动识别 JSON 和 NDJSON 格式
+
+    返回 (类型, 数据)，类型为 meta、tag、post 或 deleted。
+    """
+    first_line = stream.readline()
+    while first_line and not first_line.strip():
+        first_line = stream.readline()
+    try:
+        first = json.loads(first_line)
+    except json.JSONDecodeError:
+        first = None
+
+    if isinstance(first, dict) and 'type' in first:
+        # NDJSON：每行一条记录
+        line = first_line
+        while line:
+            if line.strip():
+                record = json.loads(line)
+                if not isinstance(record, dict) or 'type' not in record:
+                    raise BackupFormatError('文件格式错误：每行应为一条带 type 字段的记录')
+                yield record.pop('type'), record
+            line = stream.readline()
+    else:
+        yield from _iter_json(stream, first_line)
+
+def _parse_time(value, default):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return default  # 使用默认时间
+
+class _Importer:
+    def __init__(self, conflict, batch_size, progress, render):
+        if conflict not in CONFLICT_MODES:
+            raise ValueError(f'未知的冲突处理方式：{conflict}')
+        self.conflict = conflict
+        self.batch_size = batch_size
+        self.progress = progress
+        self.render = render
+        self.stats = ImportStats()
+        # 预先加载已有的 slug 和标签，导入过程中不再逐条查询
+        self.slugs = dict(db.session.query(Post.slug, Post.id).filter(Post.slug.isnot(None)))
+        self.tags = dict(db.session.query(Tag.name, Tag.id))
+        self.pending_tags = {}
+        self.pending_posts = {}  # slug（或序号）-> 文章数据
+        self.pending_deletes = []  # 待删除的文章 id
+        self.changed = False
+        # 导入结束后更新相关文章
+        self.related_tags = set()
+        self.related_posts = set()
+
+    def add_tag(self, name):
+        if name not in self.tags:
+            self.pending_tags[name] = None
+
+    def delete_post(self, slug):
+        """增量备份中记录的删除，在同一批的写入之前执行"""
+        self.pending_posts.pop(slug, None)
+        post_id = self.slugs.pop(slug, None)
+        if post_id is not None:
+            self.pending_deletes.append(post_id)
+            self.stats.deleted += 1
+            if len(self.pending_deletes) >= self.batch_size:
+                self.flush()
+
+    def add_post(self, data):
+        self.stats.processed += 1
+        slug = data.get('slug')
+        if slug is not None and (slug in self.slugs or slug in self.pending_posts):
+            if self.conflict == 'skip':
+                self.stats.skipped += 1
+                return
+            if slug in self.pending_posts:
+                # 同一文件中重复的 slug，以后出现的为准
+                self.stats.skipped += 1
+        for name in data.get('tags', []):
+            self.add_tag(name)
+        self.pending_posts[slug if slug is not None else ('#', self.stats.processed)] = data
+        if len(self.pending_posts) >= self.batch_size:
+            self.flush()
+
+    def _flush_tags(self):
+        if not self.pending_tags:
+            return
+        names = list(self.pending_tags)
+        # 已存在的标签被忽略，rowcount 只计入新建的（使用表对象执行才能取得 rowcount）
+        result = db.session.execute(
+            sqlite_insert(Tag.__table__).on_conflict_do_nothing(index_elements=['name']),
+            [{'name': name, 'post_count': 0} for name in names]
+        )
+        for i in range(0, len(names), self.batch_size):
+            chunk = names[i:i + self.batch_size]
+            self.tags.update(db.session.query(Tag.name, Tag.id).filter(Tag.name.in_(chunk)))
+        self.stats.tags_created += result.rowcount
+        self.pending_tags = {}
+
+    def _flush_deletes(self, affected_tags):
+        if not self.pending_deletes:
+            return
+        ids = self.pending_deletes
+        affected_tags.update(db.session.execute(
+            post_tags.select().with_only_columns(post_tags.c.tag_id).where(post_tags.c.post_id.in_(ids))
+        ).scalars())
+        slugs = db.session.execute(
+            Post.__table__.select().with_only_columns(Post.slug).where(Post.id.in_(ids))
+        ).scalars().all()
+        self.related_posts.update(ids)
+        db.session.execute(delete(post_tags).where(post_tags.c.post_id.in_(ids)))
+        db.session.execute(delete(Post).where(Post.id.in_(ids)).execution_options(synchronize_session=False))
+        # 恢复出的数据库之后也可能做增量备份，同样记录删除
+        db.session.execute(insert(DeletedPost), [{'slug': slug, 'deleted_at': datetime.now(CHINA_TZ)} for slug in slugs])
+        remove_posts(ids)
+        delete_revisions(ids)
+        self.pending_deletes = []
+
+    def flush(self):
+        """写入一批数据并提交"""
+        affected_tags = set()
+        self._flush_deletes(affected_tags)
+        self._flush_tags()
+        now = datetime.now(CHINA_TZ)
+        new_rows, new_tags, updates = [], [], []
+        for data in self.pending_posts.values():
+            content = data['content']
+            html = render_markdown(content) if self.render else None
+            excerpt, word_count = summarize(html) if self.render else (None, 0)
+            row = {
+                'title': data['title'],
+                'content': content,
+                'is_page': data.get('is_page', False),
+                'slug': data.get('slug'),
+                'created_at': _parse_time(data.get('created_at'), now),
+                'updated_at': _parse_time(data.get('updated_at'), now),
+                # 不渲染时留空，首次访问时渲染并回写（见 render.get_rendered）
+                'content_html': html,
+                'content_hash': content_hash(content) if self.render else None,
+                'excerpt': excerpt,
+                'word_count': word_count,
+            }
+            tag_ids = [self.tags[name] for name in dict.fromkeys(data.get('tags', []))]
+            post_id = self.slugs.get(row['slug']) if row['slug'] is not None else None
+            if post_id is None:
+                new_rows.append(row)
+                new_tags.append(tag_ids)
+            else:
+                row['id'] = post_id
+                updates.append((row, tag_ids))
+        self.pending_posts = {}
+
+        post_ids, link_rows = [], []
+        if new_rows:
+            # executemany 插入，RETURNING 按参数顺序返回新文章的 id
+            result = db.session.execute(
+                insert(Post).returning(Post.id, sort_by_parameter_order=True), new_rows
+            )
+            for row, post_id, tag_ids in zip(new_rows, result.scalars().all(), new_tags):
+                if row['slug'] is not None:
+                    self.slugs[row['slug']] = post_id
+                post_ids.append(post_id)
+                link_rows.extend({'post_id': post_id, 'tag_id': tag_id} for tag_id in tag_ids)
+                affected_tags.update(tag_ids)
+            self.stats.created += len(new_rows)
+
+        if updates:
+            update_ids = [row['id'] for row, _ in updates]
+            affected_tags.update(db.session.execute(
+                post_tags.select().with_only_columns(post_tags.c.tag_id).where(post_tags.c.post_id.in_(update_ids))
+            ).scalars())
+            db.session.execute(delete(post_tags).where(post_tags.c.post_id.in_(update_ids)))
+            previous = {id: (title, content) for id, title, content in db.session.execute(
+                Post.__table__.select().with_only_columns(Post.id, Post.title, Post.content)
+                .where(Post.id.in_(update_ids))
+            )}
+            # 按主键批量更新，updated_at 使用备份中的时间，另外记录下来供增量备份使用
+            db.session.execute(update(Post), [row for row, _ in updates])
+            db.session.execute(insert(ImportedPost), [{'post_id': id, 'imported_at': now} for id in update_ids])
+            for row, tag_ids in updates:
+                # 与后台修改文章一样记录历史版本，覆盖的内容可以恢复；内容没有变化时不需要查询历史
+                if previous[row['id']] != (row['title'], row['content']):
+                    save_revision(_Revised(row['id'], row['title'], row['content']), previous[row['id']])
+                link_rows.extend({'post_id': row['id'], 'tag_id': tag_id} for tag_id in tag_ids)
+                affected_tags.update(tag_ids)
+            post_ids.extend(update_ids)
+            self.stats.updated += len(updates)
+
+        if link_rows:
+            db.session.execute(insert(post_tags), link_rows)
+        refresh_tag_counts(affected_tags)
+        if updates or self.stats.deleted:
+            delete_orphan_tags(affected_tags)
+        index_posts(post_ids)
+        db.session.commit()
+        self.changed = True
+        self.related_tags.update(affected_tags)
+        self.related_posts.update(post_ids)
+        if self.progress:
+            self.progress(self.stats)
+
+def import_records(records, conflict='skip', batch_size=500, progress=None, render=False):
+    """把备份记录批量写入数据库，返回 ImportStats
+
+    每 batch_size 篇文章提交一次，progress(stats) 在每次提交后调用。
+    中途出错时已提交的批次会保留，使用 skip 方式重新导入同一文件即可继续。
+    markdown 渲染占导入耗时的绝大部分，默认不在导入时渲染，render 为 True 时逐篇渲染。
+    """
+    importer = _Importer(conflict, batch_size, progress, render)
+    try:
+        with db.session.no_autoflush:
+            for kind, data in records:
+                if kind in _RECORD_NAMES and not isinstance(data, dict):
+                    raise BackupFormatError(f'文件格式错误：无效的{_RECORD_NAMES[kind]}数据')
+                if kind == 'tag':
+                    importer.add_tag(data['name'])
+                elif kind == 'post':
+                    importer.add_post(data)
+                elif kind == 'deleted':
+                    importer.delete_post(data['slug'])
+            if importer.pending_posts or importer.pending_tags or importer.pending_deletes:
+                importer.flush()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if importer.changed:
+            # 导入的文章可能修改了创建时间，整体重新统计归档（只扫描索引）
+            refresh_archive()
+            # 与保存文章相同，相关文章由后台任务更新
+            enqueue('refresh_related', tag_ids=sorted(importer.related_tags), post_ids=sorted(importer.related_posts))
+            db.session.commit()
+            bump_content_version()
+    return importer.stats
+
+def import_file(fileobj, conflict='skip', batch_size=500, progress=None, render=False):
+    """从二进制文件对象导入 JSON / NDJSON 备份（可为 gzip 压缩）"""
+    return import_records(iter_records(open_backup(fileobj)), conflict, batch_size, progress, render)
@@ -1,10 +1,54 @@
-from app import app, db, AdminPassword
+from factory import create_app
+from models import db, AdminPassword, Post, RelatedPost, create_post_tags_triggers
+from tag_service import refresh_tag_counts
+from archive import refresh_archive
+from related import rebuild_related
+from search import rebuild_index
+from render import rerender_all
+
+app = create_app(web=False)
+
+def upgrade_schema():
+    """为已有数据库补齐新版本增加的列和索引（create_all 不会修改已存在的表）"""
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=db.engine.dialect)}'
+            if column.server_default is not None:
+                default = column.server_default.arg
+                ddl += f' DEFAULT {getattr(default, "text", default)}'
+            db.session.execute(db.text(ddl))
+            print(f'已添加字段：{table.name}.{column.name}')
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    db.session.commit()
 
 def init_database():
     with app.app_context():
         # 创建所有数据库表
         db.create_all()
-        
+        # 升级旧版本数据库的表结构
+        upgrade_schema()
+        create_post_tags_triggers(db.session.connection())
+        refresh_tag_counts()
+        refresh_archive()
+        db.session.commit()
+        if db.session.query(Post.id).first() and not db.session.query(RelatedPost.post_id).first():
+            print('正在计算相关文章...')
+            rebuild_related()
+            db.session.commit()
+        if db.session.query(Post.id).filter(Post.excerpt.is_(None)).first():
+            print('正在生成文章摘要...')
+            rerender_all()
+        if not db.inspect(db.engine).has_table('post_fts'):
+            print('正在建立全文索引...')
+            rebuild_index()
+
         # 检查是否已存在管理员密码
         if not AdminPassword.query.first():
             print('正在创建管理员账户...')
@@ -19,4 +63,4 @@ def init_database():
 if __name__ == '__main__':
     print('开始初始化数据库...')
     init_database()
-    print('数据库初始化完成！')
\ No newline at end of file
+    print('数据库初始化完成！')
@@ -0,0 +1,87 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from models import db, Post, DeletedPost, ImportedPost, CHINA_TZ
+
+MANIFEST_FILE = 'manifest.json'
+
+# 增量备份的时间窗口向前多取一段，避免导出开始时尚未提交的修改被漏掉；重复导出的文章恢复时会被覆盖
+OVERLAP = timedelta(minutes=5)
+
+def _path(backups_dir):
+    return os.path.join(backups_dir, MANIFEST_FILE)
+
+def load_manifest(backups_dir):
+    """读取备份清单，不存在时返回空清单"""
+    try:
+        with open(_path(backups_dir), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'backups': []}
+
+def save_manifest(backups_dir, manifest):
+    tmp_path = _path(backups_dir) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, _path(backups_dir))
+
+def latest_backup(backups_dir, manifest):
+    """返回最近一次文件仍然存在的备份，作为增量备份的上一级"""
+    for entry in reversed(manifest['backups']):
+        if os.path.exists(os.path.join(backups_dir, entry['file'])):
+            return entry
+    return None
+
+def find_backup(manifest, filename):
+    for entry in manifest['backups']:
+        if entry['file'] == filename:
+            return entry
+    return None
+
+def watermark():
+    """返回 (当前时间, 当前最大文章 id)，在导出开始前调用"""
+    now = datetime.now(CHINA_TZ).replace(tzinfo=None)  # 与数据库中的时间一样不带时区
+    max_id = db.session.query(func.max(Post.id)).scalar() or 0
+    return now, max_id
+
+def since(entry):
+    """根据上一次备份的水位计算增量导出的范围"""
+    return datetime.fromisoformat(entry['watermark']) - OVERLAP, entry['max_id']
+
+def new_entry(filename, kind, mark, parent=None):
+    now, max_id = mark
+    return {
+        'file': filename,
+        'type': kind,
+        'base': parent['base'] if parent else filename,
+        'parent': parent['file'] if parent else None,
+        'watermark': now.isoformat(),
+        'max_id': max_id,
+    }
+
+def restore_chain(manifest, filename):
+    """返回恢复到 filename 所需的备份列表：从完整备份开始依次到 filename"""
+    chain = []
+    entry = find_backup(manifest, filename)
+    if entry is None:
+        raise ValueError(f'备份清单中没有 {filename}')
+    while entry is not None:
+        chain.append(entry)
+        if entry['parent'] is None:
+            break
+        parent = find_backup(manifest, entry['parent'])
+        if parent is None:
+            raise ValueError(f'备份链不完整：缺少 {entry["parent"]}')
+        entry = parent
+    chain.reverse()
+    return chain
+
+def prune_deleted(before):
+    """完整备份之后，更早的删除记录和导入记录不会再被用到"""
+    result = db.session.execute(db.delete(DeletedPost).where(DeletedPost.deleted_at < before))
+    db.session.execute(db.delete(ImportedPost).where(ImportedPost.imported_at < before))
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,192 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+
+from models import db
+
+# 耗时直方图的桶（秒）和每个请求查询数的桶
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+class Histogram:
+    """按标签分组的累积直方图，输出为 Prometheus 文本格式"""
+
+    def __init__(self, name, description, label_names, buckets):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}  # 标签值 -> [各桶计数, 总和, 次数]
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            base = _labels(self.label_names, labels)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{base},le="{bound:g}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{base}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{base}}} {count}')
+        return lines
+
+class Counter:
+    def __init__(self, name, description, label_names):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.series = {}
+
+    def inc(self, labels):
+        self.series[labels] = self.series.get(labels, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.series.items()):
+            lines.append(f'{self.name}{{{_labels(self.label_names, labels)}}} {value}')
+        return lines
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+class RequestMetrics:
+    """汇总各路由的请求耗时、SQL、模板和 markdown 渲染时间（每个 worker 进程单独统计）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter('purecho_requests_total', '请求数', ('endpoint', 'method', 'status'))
+        self.histograms = {
+            'total': Histogram('purecho_request_duration_seconds', '请求总耗时',
+                               ('endpoint', 'method'), DURATION_BUCKETS),
+            'sql': Histogram('purecho_request_sql_duration_seconds', '每个请求的 SQL 耗时',
+                             ('endpoint',), DURATION_BUCKETS),
+            'queries': Histogram('purecho_request_sql_queries', '每个请求的 SQL 查询数',
+                                 ('endpoint',), QUERY_BUCKETS),
+            'template': Histogram('purecho_request_template_duration_seconds', '每个请求的模板渲染耗时',
+                                  ('endpoint',), DURATION_BUCKETS),
+            'markdown': Histogram('purecho_request_markdown_duration_seconds', '每个请求的 markdown 渲染耗时',
+                                  ('endpoint',), DURATION_BUCKETS),
+        }
+
+    def observe(self, endpoint, method, status, timings, total):
+        with self._lock:
+            self.requests.inc((endpoint, method, str(status)))
+            self.histograms['total'].observe((endpoint, method), total)
+            self.histograms['queries'].observe((endpoint,), timings['queries'])
+            for name in ('sql', 'template', 'markdown'):
+                self.histograms[name].observe((endpoint,), timings[name])
+
+    def render(self):
+        with self._lock:
+            lines = [f'# 进程 {os.getpid()}，多个 worker 时每个进程的统计相互独立']
+            lines += self.requests.render()
+            for histogram in self.histograms.values():
+                lines += histogram.render()
+        return '\n'.join(lines) + '\n'
+
+request_metrics = RequestMetrics()
+
+def _timings():
+    """当前请求的计时，不在请求中时返回 None"""
+    if not has_request_context():
+        return None
+    return g.get('_timings')
+
+def record(name, seconds):
+    timings = _timings()
+    if timings is not None:
+        timings[name] += seconds
+
+@contextmanager
+def timed(name):
+    """统计代码块的耗时，计入当前请求的 name 项"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    timings = _timings()
+    if timings is not None:
+        timings['sql'] += elapsed
+        timings['queries'] += 1
+
+def _handle_error(exception_context):
+    # 出错的语句没有 after_cursor_execute，清掉对应的开始时间
+    starts = exception_context.connection.info.get('_query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def _template_start(sender, template, context, **extra):
+    timings = _timings()
+    if timings is not None:
+        timings['_template_start'].append(time.perf_counter())
+
+def _template_end(sender, template, context, **extra):
+    timings = _timings()
+    if timings is not None and timings['_template_start']:
+        timings['template'] += time.perf_counter() - timings['_template_start'].pop()
+
+def _server_timing(timings, total):
+    return ', '.join([
+        f'sql;dur={timings["sql"] * 1000:.2f};desc="{timings["queries"]} queries"',
+        f'markdown;dur={timings["markdown"] * 1000:.2f}',
+        f'template;dur={timings["template"] * 1000:.2f}',
+        f'total;dur={total * 1000:.2f}',
+    ])
+
+def init_metrics(app):
+    """记录每个请求的 SQL 查询数和耗时、模板和 markdown 渲染耗时，写入 Server-Timing 响应头并汇总
+
+    流式响应（sitemap、导出）只统计到开始输出为止。在 db.init_app(app) 之后调用。
+    """
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
+    before_render_template.connect(_template_start, app)
+    template_rendered.connect(_template_end, app)
+
+    @app.before_request
+    def start_request():
+        g._timings = {'sql': 0.0, 'queries': 0, 'template': 0.0, 'markdown': 0.0, '_template_start': []}
+        g._request_start = time.perf_counter()
+
+    @app.after_request
+    def finish_request(response):
+        timings = g.pop('_timings', None)
+        if timings is None:
+            return response
+        total = time.perf_counter() - g.pop('_request_start')
+        if app.config['SERVER_TIMING_ENABLED']:
+            response.headers['Server-Timing'] = _server_timing(timings, total)
+        request_metrics.observe(request.endpoint or 'none', request.method, response.status_code, timings, total)
+        return response
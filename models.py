@@ -1,11 +1,67 @@
 from datetime import datetime, timezone, timedelta
+from functools import wraps
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.orm import defer
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # 设置中国时区
 CHINA_TZ = timezone(timedelta(hours=8))
 
-db = SQLAlchemy()
+# 只读连接的 bind 名称，连接上设置了 query_only
+READONLY_BIND = 'readonly'
+
+class RoutingSession(Session):
+    """标记为只读的请求中，查询使用只读连接；写入（flush）始终使用默认连接"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('read_only'):
+            engine = self._db.engines.get(READONLY_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def read_only(f):
+    """只读取数据的路由使用此装饰器，查询走只读连接"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_only = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+def _sqlite_pragmas(config, query_only=False):
+    pragmas = [
+        f"journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"mmap_size={config['SQLITE_MMAP_SIZE']}",
+        f"cache_size={config['SQLITE_CACHE_SIZE']}",
+        f"busy_timeout={config['SQLITE_BUSY_TIMEOUT']}",
+    ]
+    if query_only:
+        pragmas.append('query_only=ON')
+    return pragmas
+
+def init_engine_profile(app):
+    """为 SQLite 连接设置 WAL、mmap、缓存和等待锁的时间，只读 bind 的连接禁止写入
+
+    在 db.init_app(app) 之后调用。
+    """
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            pragmas = _sqlite_pragmas(app.config, query_only=key == READONLY_BIND)
+
+            @event.listens_for(engine, 'connect')
+            def set_pragmas(dbapi_connection, connection_record, pragmas=pragmas):
+                cursor = dbapi_connection.cursor()
+                for pragma in pragmas:
+                    cursor.execute(f'PRAGMA {pragma}')
+                cursor.close()
 
 class AdminPassword(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -25,16 +81,116 @@ class Post(db.Model):
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(CHINA_TZ), onupdate=lambda: datetime.now(CHINA_TZ))
     is_page = db.Column(db.Boolean, default=False)  # 是否为独立页面
     slug = db.Column(db.String(200), unique=True)  # URL友好的标识符
+    content_html = db.Column(db.Text)  # 渲染后的HTML缓存
+    content_hash = db.Column(db.String(64))  # 渲染缓存对应的正文和扩展哈希
+    excerpt = db.Column(db.Text)  # 纯文本摘要，与渲染缓存一起生成
+    word_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 字数，汉字按字、其他文字按词计
 
     # 标签关系
     tags = db.relationship('Tag', secondary='post_tags', backref=db.backref('posts', lazy='dynamic'))
 
+    __table_args__ = (
+        # 首页、标签页按创建时间分页，后台按修改时间分页
+        db.Index('ix_post_is_page_created_at_id', 'is_page', 'created_at', 'id'),
+        db.Index('ix_post_is_page_updated_at_id', 'is_page', 'updated_at', 'id'),
+    )
+
+def defer_body():
+    """列表页只显示标题、日期、摘要和标签，不读取正文和渲染后的HTML"""
+    return defer(Post.content), defer(Post.content_html), defer(Post.content_hash)
+
 class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 文章数，保存时维护
+
+class ArchiveMonth(db.Model):
+    """按月归档的文章数，保存、删除和导入文章时维护"""
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+class RelatedPost(db.Model):
+    """预先计算的相关文章，rank 从 0 开始，保存、删除和导入文章时维护"""
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    related_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+class PostRevision(db.Model):
+    """文章的历史版本：关键帧保存压缩后的全文，其余版本保存与上一版本的差异（见 revisions.py）"""
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    number = db.Column(db.Integer, nullable=False)  # 文章内从 1 开始的版本号
+    title = db.Column(db.String(200), nullable=False)
+    is_keyframe = db.Column(db.Boolean, nullable=False, default=False)
+    data = db.Column(db.LargeBinary, nullable=False)  # zlib 压缩的全文或差异
+    size = db.Column(db.Integer, nullable=False, default=0)  # 正文的字节数
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(CHINA_TZ))
+
+    __table_args__ = (
+        db.Index('ix_post_revision_post_id_number', 'post_id', 'number', unique=True),
+    )
+
+class Task(db.Model):
+    """后台任务：保存文章后的后续工作（更新相关文章、清理空标签、生成静态页面等），由 tasks.py 执行"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON 格式的参数
+    dedupe_key = db.Column(db.String(40), nullable=False)  # 任务名和参数的哈希
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending、running、done、failed
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(CHINA_TZ))
+    run_at = db.Column(db.DateTime, default=lambda: datetime.now(CHINA_TZ))  # 最早执行时间，重试时推后
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_task_status_run_at', 'status', 'run_at'),
+        # 同样的任务只保留一个在等待执行
+        db.Index('ix_task_pending_dedupe_key', 'dedupe_key', unique=True, sqlite_where=db.text("status = 'pending'")),
+    )
+
+class DeletedPost(db.Model):
+    """已删除文章的记录，增量备份据此在恢复时删除对应文章"""
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(200), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=lambda: datetime.now(CHINA_TZ), index=True)
+
+class ImportedPost(db.Model):
+    """导入时覆盖的文章：导入保留备份中的修改时间，增量备份据此包含这些文章"""
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, nullable=False)
+    imported_at = db.Column(db.DateTime, default=lambda: datetime.now(CHINA_TZ), index=True)
 
 # 文章-标签关联表
 post_tags = db.Table('post_tags',
     db.Column('post_id', db.Integer, db.ForeignKey('post.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True)
-)
\ No newline at end of file
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    db.Column('created_at', db.DateTime),  # 文章的创建时间，由触发器维护，标签页按它分页
+    db.Index('ix_post_tags_tag_id', 'tag_id', 'post_id'),  # 按标签查文章和统计文章数
+    db.Index('ix_post_tags_tag_id_created_at', 'tag_id', 'created_at', 'post_id'),  # 标签页分页
+)
+
+# 添加关联或修改文章的创建时间时，同步 post_tags.created_at
+POST_TAGS_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS post_tags_set_created_at AFTER INSERT ON post_tags BEGIN
+        UPDATE post_tags SET created_at = (SELECT created_at FROM post WHERE id = NEW.post_id)
+        WHERE post_id = NEW.post_id AND tag_id = NEW.tag_id;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS post_update_tags_created_at AFTER UPDATE OF created_at ON post BEGIN
+        UPDATE post_tags SET created_at = NEW.created_at WHERE post_id = NEW.id;
+    END''',
+]
+
+def create_post_tags_triggers(connection):
+    """创建上面的触发器（已存在时跳过），并补齐旧数据的 created_at"""
+    for ddl in POST_TAGS_TRIGGERS:
+        connection.exec_driver_sql(ddl)
+    connection.exec_driver_sql('UPDATE post_tags SET created_at = (SELECT created_at FROM post WHERE id = post_id) '
+                               'WHERE created_at IS NULL')
+
+@event.listens_for(post_tags, 'after_create')
+def _post_tags_created(target, connection, **kwargs):
+    create_post_tags_triggers(connection)
\ No newline at end of file
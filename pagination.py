@@ -0,0 +1,94 @@
+import threading
+from datetime import datetime
+
+from sqlalchemy import func, tuple_
+
+from cache import content_version
+
+CURSOR_TIME_FORMAT = '%Y%m%d%H%M%S%f'
+
+class KeysetPagination:
+    """基于游标（排序列 + id）的分页结果，翻到多深都只需一次索引范围查询"""
+
+    def __init__(self, items, per_page, total, has_prev, has_next, sort_attr):
+        self.items = items
+        self.per_page = per_page
+        self.total = total
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self._sort_attr = sort_attr
+
+    @property
+    def pages(self):
+        return max(1, -(-self.total // self.per_page))
+
+    @property
+    def prev_cursor(self):
+        if not self.has_prev or not self.items:
+            return None
+        return encode_cursor(getattr(self.items[0], self._sort_attr), self.items[0].id)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.items:
+            return None
+        return encode_cursor(getattr(self.items[-1], self._sort_attr), self.items[-1].id)
+
+def encode_cursor(value, id):
+    return f'{value.strftime(CURSOR_TIME_FORMAT)}-{id}'
+
+def decode_cursor(cursor):
+    """解析游标，格式错误时返回 None（当作第一页处理）"""
+    try:
+        value, id = cursor.split('-', 1)
+        return datetime.strptime(value, CURSOR_TIME_FORMAT), int(id)
+    except (AttributeError, ValueError):
+        return None
+
+def paginate_keyset(query, sort_column, id_column, per_page, after=None, before=None, total=None):
+    """按 (sort_column, id) 倒序分页
+
+    after 为上一页最后一条的游标，before 为下一页第一条的游标，都为空时返回第一页。
+    查询条件需能命中以 (sort_column, id) 结尾的复合索引。
+    """
+    key = tuple_(sort_column, id_column)
+    after = decode_cursor(after)
+    before = decode_cursor(before) if after is None else None
+
+    if before is not None:
+        # 向前翻页：升序取紧邻游标之前的一页，再翻转回倒序
+        rows = (query.filter(key > tuple_(*before))
+                .order_by(sort_column.asc(), id_column.asc())
+                .limit(per_page + 1).all())
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if after is not None:
+            query = query.filter(key < tuple_(*after))
+        rows = (query.order_by(sort_column.desc(), id_column.desc())
+                .limit(per_page + 1).all())
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = after is not None
+
+    return KeysetPagination(items, per_page, total or 0, has_prev, has_next, sort_column.key)
+
+# 列表总数按内容版本缓存，内容变化前不重复执行 COUNT(*)
+_count_lock = threading.Lock()
+_count_cache = {'version': None, 'counts': {}}
+
+def cached_count(key, query):
+    version, _ = content_version()
+    with _count_lock:
+        if _count_cache['version'] != version:
+            _count_cache['version'] = version
+            _count_cache['counts'] = {}
+        if key in _count_cache['counts']:
+            return _count_cache['counts'][key]
+
+    total = query.order_by(None).with_entities(func.count()).scalar()
+    with _count_lock:
+        if _count_cache['version'] == version:
+            _count_cache['counts'][key] = total
+    return total
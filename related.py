@@ -0,0 +1,209 @@
+import os
+import re
+import math
+import heapq
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from sqlalchemy import delete, insert
+
+from models import db, Post, Tag, RelatedPost, post_tags
+from search import _CJK
+from factory import dispose_engines
+
+# 开启正文相似度时，先按标签得分取 文章数 × CANDIDATE_FACTOR 篇候选，再混合排序
+CANDIDATE_FACTOR = 10
+# 文章数少于这个值时不启动多进程
+PARALLEL_MIN_POSTS = 1000
+# IN 查询每次的参数个数
+CHUNK_SIZE = 500
+
+# 汉字切分为二元组，其他文字按词切分
+_TOKEN = re.compile(f'[{_CJK}]+|[^\\W{_CJK}]+')
+_CJK_RUN = re.compile(f'[{_CJK}]')
+
+_worker = None
+
+def tokenize(text):
+    """返回 {词: 出现次数}"""
+    terms = Counter()
+    for token in _TOKEN.findall(text.lower()):
+        if _CJK_RUN.match(token):
+            if len(token) == 1:
+                terms[token] += 1
+            else:
+                terms.update(token[i:i + 2] for i in range(len(token) - 1))
+        elif len(token) > 1 and not token.isdigit():
+            terms[token] += 1
+    return terms
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), CHUNK_SIZE):
+        yield values[i:i + CHUNK_SIZE]
+
+class Corpus:
+    """计算相关文章用到的数据：文章的标签、标签下的文章、文章的创建时间
+
+    不包含独立页面和文章数超过 RELATED_MAX_TAG_POSTS 的标签；正文在需要时读取并缓存。
+    """
+
+    def __init__(self, rows):
+        self.tags_of = {}
+        self.tag_posts = {}
+        self.created = {}
+        for tag_id, post_id, created_at in rows:
+            self.tags_of.setdefault(post_id, []).append(tag_id)
+            self.tag_posts.setdefault(tag_id, []).append(post_id)
+            self.created[post_id] = created_at
+        self._terms = {}
+
+    @classmethod
+    def load(cls, max_tag_posts, tag_ids=None):
+        """读取全部标签，或 tag_ids 中的标签"""
+        query = (db.session.query(post_tags.c.tag_id, post_tags.c.post_id, Post.created_at)
+                 .join(Post, Post.id == post_tags.c.post_id)
+                 .join(Tag, Tag.id == post_tags.c.tag_id)
+                 .filter(Post.is_page == False, Tag.post_count <= max_tag_posts))
+        if tag_ids is None:
+            return cls(query.all())
+        return cls(row for chunk in _chunks(tag_ids) for row in query.filter(post_tags.c.tag_id.in_(chunk)))
+
+    def terms(self, post_ids):
+        missing = [id for id in post_ids if id not in self._terms]
+        for chunk in _chunks(missing):
+            for id, title, content in db.session.query(Post.id, Post.title, Post.content).filter(Post.id.in_(chunk)):
+                self._terms[id] = tokenize(f'{title}\n{content}')
+        return {id: self._terms.get(id, Counter()) for id in post_ids}
+
+def _vector(counts, df, total):
+    vector = {term: (1 + math.log(tf)) * math.log(1 + total / df[term]) for term, tf in counts.items()}
+    norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+    return {term: value / norm for term, value in vector.items()}
+
+def text_similarity(terms, post_id, candidates):
+    """以 post_id 和候选文章为文档集合计算 TF-IDF，返回 {候选: 与 post_id 的余弦相似度}"""
+    df = Counter()
+    for id in [post_id] + candidates:
+        df.update(terms[id].keys())
+    total = len(candidates) + 1
+    target = _vector(terms[post_id], df, total)
+    result = {}
+    for id in candidates:
+        vector = _vector(terms[id], df, total)
+        result[id] = sum(value * target.get(term, 0.0) for term, value in vector.items())
+    return result
+
+def rank_related(corpus, post_id, count, text_weight=0.0):
+    """返回与 post_id 最相关的文章 [(id, 分数)]，分数高的在前，相同时较新的在前
+
+    每个共同标签计 1 / log2(1 + 标签的文章数) 分，冷门标签比热门标签更能说明相关。
+    text_weight 大于 0 时，取标签得分最高的一批候选，与正文 TF-IDF 余弦相似度按比例混合。
+    只依赖 post_id 的标签和这些标签下的文章，所以增量更新和全部重新计算的结果相同。
+    """
+    scores = {}
+    for tag_id in sorted(corpus.tags_of.get(post_id, ())):
+        posts = corpus.tag_posts[tag_id]
+        weight = 1 / math.log2(1 + len(posts))
+        for other in posts:
+            if other != post_id:
+                scores[other] = scores.get(other, 0.0) + weight
+    if not scores:
+        return []
+
+    def order(id):
+        return scores[id], corpus.created[id], id
+
+    if text_weight > 0:
+        candidates = heapq.nlargest(count * CANDIDATE_FACTOR, scores, key=order)
+        similarity = text_similarity(corpus.terms([post_id] + candidates), post_id, candidates)
+        top = scores[candidates[0]]
+        scores = {id: (1 - text_weight) * scores[id] / top + text_weight * similarity[id] for id in candidates}
+    # 消除浮点数累加顺序造成的差异，保证排序稳定
+    scores = {id: round(score, 9) for id, score in scores.items()}
+    return [(id, scores[id]) for id in heapq.nlargest(count, scores, key=order)]
+
+def _settings():
+    config = current_app.config
+    return config['RELATED_POSTS_COUNT'], config['RELATED_TEXT_WEIGHT'], config['RELATED_MAX_TAG_POSTS']
+
+def _store(results, replace=True):
+    """写入 {文章 id: [(相关文章 id, 分数)]}，replace 为 True 时先删除这些文章原有的记录"""
+    if replace:
+        for chunk in _chunks(results):
+            db.session.execute(delete(RelatedPost).where(RelatedPost.post_id.in_(chunk)))
+    rows = [{'post_id': id, 'rank': rank, 'related_id': other, 'score': score}
+            for id, related in results.items() for rank, (other, score) in enumerate(related)]
+    if rows:
+        db.session.execute(insert(RelatedPost), rows)
+
+def refresh_related(tag_ids, post_ids=()):
+    """保存、删除文章后增量更新：重新计算 post_ids 以及与其有共同标签的文章，返回更新的文章数
+
+    tag_ids 为文章修改前和修改后的全部标签，在 refresh_tag_counts 之后调用；
+    已删除或改为独立页面的文章，其相关文章记录会被清除。
+    """
+    count, text_weight, max_tag_posts = _settings()
+    affected = set(post_ids)
+    # 文章数刚超过上限的标签也要更新，去掉它在这些文章中原有的得分
+    for chunk in _chunks(set(tag_ids)):
+        affected.update(id for (id,) in db.session.query(post_tags.c.post_id)
+                        .join(Tag, Tag.id == post_tags.c.tag_id)
+                        .filter(post_tags.c.tag_id.in_(chunk), Tag.post_count <= max_tag_posts + 1))
+    if not affected:
+        return 0
+
+    # 这些文章的全部标签，以及这些标签下的文章
+    second = set()
+    for chunk in _chunks(affected):
+        second.update(id for (id,) in db.session.query(post_tags.c.tag_id).filter(post_tags.c.post_id.in_(chunk)))
+    corpus = Corpus.load(max_tag_posts, second)
+    _store({id: rank_related(corpus, id, count, text_weight) for id in affected})
+    return len(affected)
+
+def _init_worker():
+    dispose_engines(_worker[0])
+
+def _rank_chunk(post_ids):
+    app, corpus, count, text_weight = _worker
+    with app.app_context():
+        return {id: rank_related(corpus, id, count, text_weight) for id in post_ids}
+
+def rebuild_related(workers=None):
+    """全部重新计算（初始化、修改配置后使用），返回有标签的文章数
+
+    workers 为 None 时读取 RELATED_WORKERS。多进程时标签数据在 fork 前读取，由各进程共享，正文各自读取。
+    """
+    global _worker
+    count, text_weight, max_tag_posts = _settings()
+    corpus = Corpus.load(max_tag_posts)
+    post_ids = sorted(corpus.tags_of)
+    if workers is None:
+        workers = current_app.config['RELATED_WORKERS'] or os.cpu_count() or 1
+
+    if workers > 1 and len(post_ids) >= PARALLEL_MIN_POSTS:
+        _worker = (current_app._get_current_object(), corpus, count, text_weight)
+        size = -(-len(post_ids) // (workers * 4))
+        results = {}
+        try:
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'),
+                                     initializer=_init_worker) as executor:
+                for part in executor.map(_rank_chunk, [post_ids[i:i + size] for i in range(0, len(post_ids), size)]):
+                    results.update(part)
+        finally:
+            _worker = None
+    else:
+        results = {id: rank_related(corpus, id, count, text_weight) for id in post_ids}
+
+    db.session.execute(delete(RelatedPost))
+    _store(results, replace=False)
+    return len(post_ids)
+
+def related_posts(post_id, limit):
+    """文章页显示的相关文章（标题和 slug），按主键范围读取"""
+    return (db.session.query(Post.title, Post.slug)
+            .join(RelatedPost, RelatedPost.related_id == Post.id)
+            .filter(RelatedPost.post_id == post_id, RelatedPost.rank < limit, Post.slug.isnot(None))
+            .order_by(RelatedPost.rank).all())
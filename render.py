@@ -0,0 +1,106 @@
+import re
+import hashlib
+from html import unescape
+
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+
+from models import db, Post
+from metrics import timed
+from search import _CJK
+
+# 文章正文使用的 markdown 扩展，修改后运行 python backup.py rerender 重新渲染
+MARKDOWN_EXTENSIONS = ['fenced_code', 'nl2br', 'tables', 'abbr']
+# 列表页摘要的最大字数，修改后运行 python backup.py rerender --force 重新生成
+EXCERPT_LENGTH = 120
+
+_CODE_BLOCK = re.compile(r'<pre>.*?</pre>', re.S)
+_HTML_TAG = re.compile(r'<[^>]+>')
+# 汉字每个字计一个，其他文字按词计
+_WORD = re.compile(f'[{_CJK}]|[^\\W_{_CJK}]+')
+
+def content_hash(content, extensions=MARKDOWN_EXTENSIONS):
+    """根据正文和扩展列表计算渲染缓存的键"""
+    key = ','.join(extensions) + '\n' + content
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def render_markdown(content, extensions=MARKDOWN_EXTENSIONS):
+    # 首次渲染时才导入 markdown，扩展也由 markdown 按名称在使用时导入；
+    # 不复用 Markdown 实例：abbr 扩展会把缩写定义留在实例上，影响之后渲染的文章
+    import markdown
+
+    with timed('markdown'):
+        return markdown.markdown(content, extensions=extensions)
+
+def summarize(html):
+    """从渲染后的HTML生成 (摘要, 字数)，代码块不计入"""
+    text = unescape(_HTML_TAG.sub('', _CODE_BLOCK.sub('\n', html)))
+    text = re.sub(r'\s+', ' ', text).strip()
+    excerpt = text if len(text) <= EXCERPT_LENGTH else text[:EXCERPT_LENGTH].rstrip() + '…'
+    return excerpt, len(_WORD.findall(text))
+
+def is_fresh(post):
+    return post.content_html is not None and post.content_hash == content_hash(post.content)
+
+def refresh_rendered(post):
+    """保存文章时调用：正文或扩展变化时重新渲染，同时更新摘要和字数"""
+    if not is_fresh(post):
+        post.content_html = render_markdown(post.content)
+        post.content_hash = content_hash(post.content)
+        post.excerpt = None
+    if post.excerpt is None:
+        post.excerpt, post.word_count = summarize(post.content_html)
+
+def get_rendered(post):
+    """读取文章时调用：缓存失效则渲染并回写"""
+    if is_fresh(post):
+        return post.content_html
+
+    html = render_markdown(post.content)
+    excerpt, word_count = summarize(html)
+    # 使用独立连接回写，显式保留 updated_at，避免读取操作改动文章的修改时间
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(Post)
+                .where(Post.id == post.id)
+                .values(content_html=html, content_hash=content_hash(post.content),
+                        excerpt=excerpt, word_count=word_count, updated_at=Post.updated_at)
+            )
+    except OperationalError:
+        pass  # 数据库正被长时间写入（如导入）时放弃回写，下次访问再写，不影响页面显示
+    return html
+
+def rerender_all(force=False, batch_size=200):
+    """重新渲染所有文章，返回 (检查数, 更新数)
+
+    渲染缓存有效但没有摘要的文章（旧版本数据库）只从缓存的HTML生成摘要和字数。
+    """
+    checked = updated = 0
+    last_id = 0
+    while True:
+        posts = (Post.query.filter(Post.id > last_id)
+                 .order_by(Post.id).limit(batch_size).all())
+        if not posts:
+            break
+        for post in posts:
+            checked += 1
+            if force or not is_fresh(post):
+                html = render_markdown(post.content)
+                values = {'content_html': html, 'content_hash': content_hash(post.content)}
+            elif post.excerpt is None:
+                html = post.content_html
+                values = {}
+            else:
+                continue
+            values['excerpt'], values['word_count'] = summarize(html)
+            db.session.execute(
+                update(Post)
+                .where(Post.id == post.id)
+                .values(updated_at=Post.updated_at, **values)
+            )
+            updated += 1
+        last_id = posts[-1].id
+        db.session.commit()
+        db.session.expunge_all()
+    return checked, updated
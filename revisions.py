@@ -0,0 +1,144 @@
+import json
+import zlib
+import difflib
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import delete, func
+
+from models import db, Post, PostRevision
+
+Revision = namedtuple('Revision', 'number title content created_at is_keyframe')
+
+def _pack(value):
+    return zlib.compress(value.encode('utf-8'), 9)
+
+def _unpack(data):
+    return zlib.decompress(data).decode('utf-8')
+
+def make_delta(old, new):
+    """按行比较，返回压缩后的差异：[起, 止] 复制上一版本的行，字符串为新写入的内容"""
+    a = old.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j1 < j2:
+            ops.append(''.join(b[j1:j2]))
+    return _pack(json.dumps(ops, ensure_ascii=False, separators=(',', ':')))
+
+def apply_delta(old, data):
+    a = old.splitlines(keepends=True)
+    return ''.join(''.join(a[op[0]:op[1]]) if isinstance(op, list) else op for op in json.loads(_unpack(data)))
+
+def _rows(post_id, number):
+    """从 number 之前最近的关键帧到 number 的记录，最多 REVISION_KEYFRAME_INTERVAL 条"""
+    keyframe = (db.session.query(func.max(PostRevision.number))
+                .filter(PostRevision.post_id == post_id, PostRevision.number <= number,
+                        PostRevision.is_keyframe == True)
+                .scalar())
+    if keyframe is None:
+        return []
+    return (PostRevision.query
+            .filter(PostRevision.post_id == post_id, PostRevision.number.between(keyframe, number))
+            .order_by(PostRevision.number).all())
+
+def load_revision(post_id, number):
+    """还原第 number 个版本，不存在时返回 None"""
+    rows = _rows(post_id, number)
+    if not rows or rows[-1].number != number:
+        return None
+    content = None
+    for row in rows:
+        content = _unpack(row.data) if row.is_keyframe else apply_delta(content, row.data)
+    row = rows[-1]
+    return Revision(row.number, row.title, content, row.created_at, row.is_keyframe)
+
+def latest_number(post_id):
+    return db.session.query(func.max(PostRevision.number)).filter(PostRevision.post_id == post_id).scalar()
+
+def save_revision(post, previous=None):
+    """保存文章后调用，记录新版本，返回版本号；标题和正文都没有变化时不记录
+
+    文章还没有历史记录时，previous 为修改前的 (标题, 正文)，先记为第 1 个版本。
+    每隔 REVISION_KEYFRAME_INTERVAL 个版本（或差异不比全文小时）保存一次全文，
+    还原任意版本最多读取这么多条记录。
+    """
+    config = current_app.config
+    number = latest_number(post.id)
+    if number is None:
+        if previous is not None and previous != (post.title, post.content):
+            db.session.add(PostRevision(post_id=post.id, number=1, title=previous[0], is_keyframe=True,
+                                        data=_pack(previous[1]), size=len(previous[1].encode('utf-8'))))
+            number = 1
+            last = Revision(1, previous[0], previous[1], None, True)
+        else:
+            last = None
+    else:
+        last = load_revision(post.id, number)
+        if (last.title, last.content) == (post.title, post.content):
+            return number
+
+    full = _pack(post.content)
+    is_keyframe, data = True, full
+    if last is not None and number % config['REVISION_KEYFRAME_INTERVAL'] != 0:
+        delta = make_delta(last.content, post.content)
+        if len(delta) < len(full):
+            is_keyframe, data = False, delta
+    number = (number or 0) + 1
+    db.session.add(PostRevision(post_id=post.id, number=number, title=post.title, is_keyframe=is_keyframe,
+                                data=data, size=len(post.content.encode('utf-8'))))
+    db.session.flush()
+    prune_revisions(post.id, config['REVISION_KEEP'])
+    return number
+
+def prune_revisions(post_id, keep):
+    """只保留最近 keep 个版本（0 为不限），最早保留的版本改存全文，返回删除数量"""
+    if keep <= 0:
+        return 0
+    first = (db.session.query(func.min(PostRevision.number))
+             .filter(PostRevision.post_id == post_id).scalar())
+    number = latest_number(post_id)
+    if number is None or number - first < keep:
+        return 0
+    cutoff = number - keep + 1
+    row = PostRevision.query.filter_by(post_id=post_id, number=cutoff).one()
+    if not row.is_keyframe:
+        revision = load_revision(post_id, cutoff)
+        row.is_keyframe, row.data = True, _pack(revision.content)
+    result = db.session.execute(
+        delete(PostRevision).where(PostRevision.post_id == post_id, PostRevision.number < cutoff)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+def prune_all_revisions(keep):
+    """按 keep 清理所有文章的历史版本，并删除已删除文章留下的记录，返回删除数量"""
+    deleted = db.session.execute(
+        delete(PostRevision).where(~PostRevision.post_id.in_(db.session.query(Post.id)))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if keep > 0:
+        post_ids = (db.session.query(PostRevision.post_id).group_by(PostRevision.post_id)
+                    .having(func.count() > keep).all())
+        for (post_id,) in post_ids:
+            deleted += prune_revisions(post_id, keep)
+    return deleted
+
+def delete_revisions(post_ids):
+    db.session.execute(delete(PostRevision).where(PostRevision.post_id.in_(list(post_ids)))
+                       .execution_options(synchronize_session=False))
+
+def list_revisions(post_id):
+    """版本列表（新的在前），不读取内容；stored 为实际占用的字节数"""
+    return (db.session.query(PostRevision.number, PostRevision.title, PostRevision.is_keyframe,
+                             PostRevision.size, func.length(PostRevision.data).label('stored'),
+                             PostRevision.created_at)
+            .filter(PostRevision.post_id == post_id)
+            .order_by(PostRevision.number.desc()).all())
+
+def diff_lines(old, new, old_label, new_label):
+    """unified diff 的各行，供模板按首字符着色"""
+    return [line.rstrip('\n') for line in difflib.unified_diff(
+        old.splitlines(keepends=True), new.splitlines(keepends=True), old_label, new_label)]
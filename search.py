@@ -0,0 +1,156 @@
+import re
+
+from flask import current_app
+from markupsafe import Markup, escape
+from sqlalchemy import text
+from sqlalchemy.orm import defer
+
+from models import db, Post
+
+# 中日韩字符：unicode61 分词器会把连续的汉字当作一个词，
+# cjk 模式下把连续的汉字切成相互重叠的二元组（"数据库" -> "数据 据库"），
+# 查询时按短语匹配相邻的二元组
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_CJK_RUN = re.compile(f'[{_CJK}]+')
+
+TOKENIZERS = {
+    'cjk': 'unicode61 remove_diacritics 2',
+    'unicode61': 'unicode61 remove_diacritics 2',
+    'trigram': 'trigram',
+}
+
+SNIPPET_LENGTH = 120
+
+def _tokenizer_mode():
+    mode = current_app.config['SEARCH_TOKENIZER']
+    if mode not in TOKENIZERS:
+        raise ValueError(f'未知的分词方式：{mode}')
+    return mode
+
+def _bigrams(match):
+    run = match.group(0)
+    if len(run) == 1:
+        return f' {run} '
+    return ' ' + ' '.join(run[i:i + 2] for i in range(len(run) - 1)) + ' '
+
+def segment(value):
+    """cjk 模式下把汉字切分为二元组"""
+    if _tokenizer_mode() != 'cjk':
+        return value
+    return _CJK_RUN.sub(_bigrams, value)
+
+def ensure_index():
+    db.session.execute(text(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5('
+        f"title, content, tokenize='{TOKENIZERS[_tokenizer_mode()]}')"
+    ))
+
+def remove_posts(post_ids):
+    """从索引中删除文章"""
+    post_ids = list(post_ids)
+    if post_ids:
+        db.session.execute(text('DELETE FROM post_fts WHERE rowid = :id'), [{'id': id} for id in post_ids])
+
+def index_posts(post_ids):
+    """增量更新文章的索引，保存、删除、导入时调用"""
+    post_ids = list(set(post_ids))
+    if not post_ids:
+        return
+    remove_posts(post_ids)
+    rows = (db.session.query(Post.id, Post.title, Post.content)
+            .filter(Post.id.in_(post_ids)).all())
+    if rows:
+        # 索引中保存切分后的文本，只用于匹配，摘要从原文截取
+        db.session.execute(
+            text('INSERT INTO post_fts (rowid, title, content) VALUES (:id, :title, :content)'),
+            [{'id': id, 'title': segment(title), 'content': segment(content)} for id, title, content in rows]
+        )
+
+def rebuild_index(batch_size=500):
+    """重建全文索引（修改分词方式或升级旧数据库后使用），返回索引的文章数"""
+    db.session.execute(text('DROP TABLE IF EXISTS post_fts'))
+    ensure_index()
+    total = 0
+    last_id = 0
+    while True:
+        ids = [id for (id,) in db.session.query(Post.id)
+               .filter(Post.id > last_id).order_by(Post.id).limit(batch_size)]
+        if not ids:
+            break
+        index_posts(ids)
+        total += len(ids)
+        last_id = ids[-1]
+        db.session.commit()
+    db.session.execute(text("INSERT INTO post_fts (post_fts) VALUES ('optimize')"))
+    db.session.commit()
+    return total
+
+def build_match_query(query):
+    """把用户输入转换为 FTS5 查询：每个词作为短语，词之间为 AND"""
+    phrases = []
+    for word in query.split():
+        if not re.search(r'\w', word):
+            continue
+        phrase = '"' + segment(word).strip().replace('"', '""') + '"'
+        if _tokenizer_mode() == 'cjk' and len(word) == 1 and _CJK_RUN.fullmatch(word):
+            # 单个汉字没有对应的二元组，按前缀匹配
+            phrase += '*'
+        phrases.append(phrase)
+    return ' '.join(phrases)
+
+def _highlight(value, words):
+    """转义后给关键词加 <mark>"""
+    pattern = re.compile('|'.join(re.escape(word) for word in words), re.IGNORECASE)
+    html, last = [], 0
+    for match in pattern.finditer(value):
+        html.append(str(escape(value[last:match.start()])))
+        html.append(f'<mark>{escape(match.group(0))}</mark>')
+        last = match.end()
+    html.append(str(escape(value[last:])))
+    return Markup(''.join(html))
+
+def _snippet(content, words):
+    """截取第一个关键词附近的一段正文"""
+    lowered = content.lower()
+    positions = [pos for pos in (lowered.find(word.lower()) for word in words) if pos >= 0]
+    start = max(0, min(positions) - SNIPPET_LENGTH // 4) if positions else 0
+    snippet = re.sub(r'\s+', ' ', content[start:start + SNIPPET_LENGTH]).strip()
+    if start > 0:
+        snippet = '…' + snippet
+    if start + SNIPPET_LENGTH < len(content):
+        snippet += '…'
+    return snippet
+
+def search_posts(query, page=1, per_page=10):
+    """全文搜索，在全部匹配中按 bm25 排序（标题权重更高），返回 (结果列表, 结果数)"""
+    match = build_match_query(query)
+    if not match:
+        return [], 0
+
+    total = db.session.execute(
+        text('SELECT count(*) FROM post_fts WHERE post_fts MATCH :match'), {'match': match}
+    ).scalar()
+    if not total:
+        return [], 0
+
+    ids = db.session.execute(text(
+        'SELECT rowid FROM post_fts WHERE post_fts MATCH :match '
+        'ORDER BY bm25(post_fts, 10.0, 1.0) LIMIT :limit OFFSET :offset'
+    ), {'match': match, 'limit': per_page, 'offset': (page - 1) * per_page}).scalars().all()
+    posts = {post.id: post for post in Post.query.filter(Post.id.in_(ids)).options(defer(Post.content_html))}
+
+    words = [word for word in query.split() if re.search(r'\w', word)]
+    results = []
+    for id in ids:
+        post = posts.get(id)
+        if post is None:
+            continue
+        results.append({
+            'id': post.id,
+            'slug': post.slug,
+            'is_page': post.is_page,
+            'created_at': post.created_at,
+            'title': _highlight(post.title, words),
+            'snippet': _highlight(_snippet(post.content, words), words),
+        })
+    return results, total
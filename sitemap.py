@@ -1,30 +1,95 @@
-from datetime import datetime
-from xml.etree import ElementTree as ET
-from models import Post
-
-def generate_sitemap(posts, config):
-    # 创建根元素
-    urlset = ET.Element('urlset', {'xmlns': 'http://www.sitemaps.org/schemas/sitemap/0.9'})
-    
-    # 添加首页
-    home_url = ET.SubElement(urlset, 'url')
-    ET.SubElement(home_url, 'loc').text = config.SITE_URL
-    ET.SubElement(home_url, 'lastmod').text = datetime.now().strftime('%Y-%m-%d')
-    ET.SubElement(home_url, 'changefreq').text = 'daily'
-    ET.SubElement(home_url, 'priority').text = '1.0'
-    
-    # 添加所有文章和页面
-    for post in posts:
-        url = ET.SubElement(urlset, 'url')
-        if post.is_page:
-            ET.SubElement(url, 'loc').text = f'{config.SITE_URL}/page/{post.slug}'
-        else:
-            ET.SubElement(url, 'loc').text = f'{config.SITE_URL}/post/{post.slug}'
-        ET.SubElement(url, 'lastmod').text = post.updated_at.strftime('%Y-%m-%d')
-        ET.SubElement(url, 'changefreq').text = 'weekly'
-        ET.SubElement(url, 'priority').text = '0.8'
-    
-    # 生成XML
-    tree = ET.ElementTree(urlset)
-    ET.indent(tree, space='  ')
-    return ET.tostring(urlset, encoding='unicode', method='xml')
\ No newline at end of file
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from sqlalchemy import func
+
+from models import db, Post, Tag
+
+# 协议规定单个 sitemap 最多 50000 个 URL
+MAX_URLS_PER_SITEMAP = 50000
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+def _url(loc, lastmod, changefreq, priority):
+    return (f'  <url>\n'
+            f'    <loc>{escape(loc)}</loc>\n'
+            f'    <lastmod>{lastmod}</lastmod>\n'
+            f'    <changefreq>{changefreq}</changefreq>\n'
+            f'    <priority>{priority}</priority>\n'
+            f'  </url>\n')
+
+def count_urls():
+    """返回 (文章和页面数, 标签数)"""
+    return (db.session.query(func.count(Post.id)).filter(Post.slug.isnot(None)).scalar(),
+            db.session.query(func.count(Tag.id)).scalar())
+
+def sitemap_chunks():
+    """返回分片数量，不超过上限时为 1（不使用 sitemap 索引）"""
+    posts, tags = count_urls()
+    return max(1, -(-(1 + posts + tags) // MAX_URLS_PER_SITEMAP))
+
+def _iter_rows(query, offset, limit):
+    if limit is not None and limit <= 0:
+        return
+    query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    yield from query.execution_options(yield_per=1000)
+
+def generate_sitemap(config, last_modified, chunk=None):
+    """逐段生成 sitemap XML，只查询需要的列
+
+    URL 依次为首页、文章和页面、标签。chunk 为 None 时生成全部 URL，
+    否则只生成第 chunk 个分片（从 1 开始）。
+    """
+    lastmod = last_modified.strftime('%Y-%m-%d')
+    if chunk is None:
+        start, limit = 0, None
+    else:
+        start, limit = (chunk - 1) * MAX_URLS_PER_SITEMAP, MAX_URLS_PER_SITEMAP
+
+    yield XML_HEADER
+    yield f'<urlset xmlns="{SITEMAP_NS}">\n'
+
+    # 首页
+    if start == 0:
+        yield _url(config.SITE_URL, lastmod, 'daily', '1.0')
+        limit = None if limit is None else limit - 1
+    else:
+        start -= 1
+
+    # 所有文章和页面
+    post_count, _ = count_urls() if chunk is not None else (None, None)
+    posts = (db.session.query(Post.slug, Post.is_page, Post.updated_at)
+             .filter(Post.slug.isnot(None))
+             .order_by(Post.updated_at.desc(), Post.id.desc()))
+    emitted = 0
+    for slug, is_page, updated_at in _iter_rows(posts, start, limit):
+        path = 'page' if is_page else 'post'
+        yield _url(f'{config.SITE_URL}/{path}/{quote(slug)}', updated_at.strftime('%Y-%m-%d'), 'weekly', '0.8')
+        emitted += 1
+
+    # 所有标签
+    if limit is not None:
+        limit -= emitted
+        start = max(0, start - post_count)
+    else:
+        start = 0
+    tags = db.session.query(Tag.name).order_by(Tag.name)
+    for (name,) in _iter_rows(tags, start, limit):
+        yield _url(f'{config.SITE_URL}/tag/{quote(name)}', lastmod, 'weekly', '0.5')
+
+    yield '</urlset>\n'
+
+def generate_sitemap_index(config, last_modified, chunks):
+    """URL 超过上限时，/sitemap.xml 输出指向各分片的索引"""
+    lastmod = last_modified.strftime('%Y-%m-%d')
+    yield XML_HEADER
+    yield f'<sitemapindex xmlns="{SITEMAP_NS}">\n'
+    for n in range(1, chunks + 1):
+        yield (f'  <sitemap>\n'
+               f'    <loc>{escape(config.SITE_URL)}/sitemap-{n}.xml</loc>\n'
+               f'    <lastmod>{lastmod}</lastmod>\n'
+               f'  </sitemap>\n')
+    yield '</sitemapindex>\n'
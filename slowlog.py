@@ -0,0 +1,147 @@
+import json
+import os
+import time
+import logging
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from models import db
+
+logger = logging.getLogger('purecho.slow_query')
+
+# 参数中的长文本（如文章正文）只记录开头
+MAX_PARAM_LENGTH = 200
+
+def _short(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    text = value if isinstance(value, str) else repr(value) if isinstance(value, bytes) else str(value)
+    if len(text) > MAX_PARAM_LENGTH:
+        return f'{text[:MAX_PARAM_LENGTH]}...（共 {len(text)} 个字符）'
+    return text
+
+def _params(parameters, executemany):
+    if executemany:
+        return f'executemany，共 {len(parameters)} 组'
+    if isinstance(parameters, dict):
+        return {key: _short(value) for key, value in parameters.items()}
+    return [_short(value) for value in parameters or ()]
+
+def full_scans(plan):
+    """返回查询计划中整表扫描的表名（不含索引扫描和 FTS 虚拟表）"""
+    tables = []
+    for _, _, detail in plan:
+        if detail.startswith('SCAN ') and 'USING' not in detail and 'VIRTUAL TABLE' not in detail:
+            words = detail.split()
+            # SQLite 3.36 之前的格式为 SCAN TABLE t
+            tables.append(words[2] if words[1] == 'TABLE' and len(words) > 2 else words[1])
+    return tables
+
+def explain(dbapi_connection, statement, parameters):
+    """用 EXPLAIN QUERY PLAN 取查询计划，返回 [(id, 父节点 id, 说明)]，失败时返回空列表"""
+    try:
+        cursor = dbapi_connection.cursor()
+        try:
+            rows = cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ()).fetchall()
+        finally:
+            cursor.close()
+    except Exception:
+        return []
+    return [(row[0], row[1], row[3]) for row in rows]
+
+def format_plan(plan):
+    """把查询计划排成缩进的树形文本"""
+    depth = {0: -1}
+    lines = []
+    for id, parent, detail in plan:
+        depth[id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[id] + detail)
+    return '\n'.join(lines)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_slow_query_start', []).append(time.perf_counter())
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get('_slow_query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def _after_cursor_execute(threshold):
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('_slow_query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        if elapsed < threshold:
+            return
+        plan = [] if executemany else explain(cursor.connection, statement, parameters)
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'duration_ms': round(elapsed * 1000, 2),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'path': request.full_path.rstrip('?') if has_request_context() else None,
+            'sql': statement,
+            'params': _params(parameters, executemany),
+            'plan': format_plan(plan),
+            'full_scans': full_scans(plan),
+        }
+        logger.warning(json.dumps(entry, ensure_ascii=False, default=str))
+    return listener
+
+def init_slow_query_log(app):
+    """SLOW_QUERY_ENABLED 为 true 时，记录超过 SLOW_QUERY_THRESHOLD_MS 的 SQL 及其查询计划
+
+    耗时从执行到返回第一行为止；SQLite 边取边扫描的查询，后续读取的时间不计入。在 db.init_app(app) 之后调用。
+    """
+    if not app.config['SLOW_QUERY_ENABLED']:
+        return
+
+    path = app.config['SLOW_QUERY_LOG']
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not any(getattr(handler, 'baseFilename', None) == os.path.abspath(path) for handler in logger.handlers):
+        handler = RotatingFileHandler(path, maxBytes=app.config['SLOW_QUERY_LOG_MAX_BYTES'],
+                                      backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'], encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    logger.setLevel(logging.WARNING)
+    logger.propagate = False
+
+    after = _after_cursor_execute(app.config['SLOW_QUERY_THRESHOLD_MS'] / 1000)
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', after)
+            event.listen(engine, 'handle_error', _handle_error)
+
+def read_slow_queries(path, limit=200):
+    """读取最近的慢查询记录，最新的在前（只读当前日志文件，轮转出去的旧文件不读）"""
+    if not os.path.exists(path):
+        return []
+    entries = deque(maxlen=limit)
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # 其他进程正在写入的半行
+    return list(reversed(entries))
+
+def summarize(entries):
+    """按 SQL 语句汇总：次数、平均和最长耗时，按总耗时从高到低排列"""
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['sql'], {'sql': entry['sql'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                                 'full_scans': entry['full_scans'], 'endpoints': set()})
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        if entry['endpoint']:
+            group['endpoints'].add(entry['endpoint'])
+    for group in groups.values():
+        group['avg_ms'] = group['total_ms'] / group['count']
+        group['endpoints'] = sorted(group['endpoints'])
+    return sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
@@ -0,0 +1,139 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+from sqlalchemy.engine import make_url
+
+SNAPSHOT_PREFIX = 'snapshot_'
+
+# 每步复制的页数和两步之间的停顿，复制期间网站可以继续读写
+STEP_PAGES = 1024
+STEP_SLEEP = 0.005
+
+# 复制过程中源数据库被其他连接修改时，SQLite 会从头重新复制；超过这个次数后改为一步复制完
+MAX_RESTARTS = 3
+
+class _TooManyRestarts(Exception):
+    pass
+
+def database_path(uri):
+    """从 SQLALCHEMY_DATABASE_URI 中取出 SQLite 数据库文件路径"""
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        raise ValueError(f'快照只支持 SQLite 数据库文件：{uri}')
+    return url.database
+
+def snapshot_filename(compress=False, now=None):
+    now = now or datetime.now()
+    return f'{SNAPSHOT_PREFIX}{now.strftime("%Y%m%d_%H%M%S")}.db' + ('.gz' if compress else '')
+
+def _copy(src, dst, progress=None):
+    """用在线备份 API 分步复制，返回复制的页数"""
+    state = {'remaining': None, 'restarts': 0, 'total': 0}
+
+    def step(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state['remaining'], state['total'] = remaining, total
+        if progress:
+            progress(total - remaining, total)
+        time.sleep(STEP_SLEEP)  # 释放锁，让其他连接有机会写入
+
+    try:
+        src.backup(dst, pages=STEP_PAGES, progress=step)
+    except _TooManyRestarts:
+        # 网站写入频繁时分步复制总是被打断，改为一次复制完（期间短暂阻塞写入）
+        src.backup(dst)
+    return state['total']
+
+def check_integrity(path):
+    """对数据库文件执行 integrity_check，有问题时抛出 ValueError"""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        result = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    finally:
+        conn.close()
+    if result != ['ok']:
+        raise ValueError('完整性检查失败：' + '; '.join(result[:5]))
+
+def _gzip_file(src_path, dst_path):
+    with open(src_path, 'rb') as src, gzip.open(dst_path, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+def _gunzip_file(src_path, dst_path):
+    with gzip.open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+def create_snapshot(db_path, backups_dir, compress=False, progress=None):
+    """为数据库创建快照并校验，返回快照文件路径"""
+    os.makedirs(backups_dir, exist_ok=True)
+    path = os.path.join(backups_dir, snapshot_filename(compress))
+    tmp_path = os.path.join(backups_dir, snapshot_filename() + '.tmp')
+    try:
+        # WAL 模式的数据库以只读方式打开时可能无法读取 -wal 文件，这里使用普通连接（备份不会写入源库）
+        src = sqlite3.connect(db_path, timeout=30)
+        dst = sqlite3.connect(tmp_path)
+        try:
+            _copy(src, dst, progress)
+            # 快照是单个文件，不使用 WAL，便于直接复制和只读校验
+            dst.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            dst.close()
+            src.close()
+        check_integrity(tmp_path)
+        if compress:
+            _gzip_file(tmp_path, path + '.tmp')
+            os.remove(tmp_path)
+            tmp_path = path + '.tmp'
+        os.replace(tmp_path, path)
+    except BaseException:
+        for leftover in (tmp_path, path + '.tmp'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    return path
+
+def restore_snapshot(snapshot_path, db_path, progress=None, before_restore=None):
+    """用快照覆盖数据库：先校验快照，再通过备份 API 写入，正在运行的网站会读到完整的新数据
+
+    before_restore 在校验通过、覆盖之前调用（如为当前数据库再做一次快照）。
+    """
+    tmp_path = None
+    try:
+        if snapshot_path.endswith('.gz'):
+            tmp_path = db_path + '.restore.tmp'
+            _gunzip_file(snapshot_path, tmp_path)
+            snapshot_path = tmp_path
+        check_integrity(snapshot_path)
+        if before_restore:
+            before_restore()
+        src = sqlite3.connect(f'file:{snapshot_path}?mode=ro', uri=True)
+        dst = sqlite3.connect(db_path, timeout=30)
+        try:
+            # 写入目标库时一次完成，避免网站读到一半新一半旧的数据
+            src.backup(dst, progress=(lambda status, remaining, total: progress(total - remaining, total)) if progress else None)
+        finally:
+            dst.close()
+            src.close()
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def list_snapshots(backups_dir):
+    """返回快照文件名，从旧到新排列"""
+    if not os.path.isdir(backups_dir):
+        return []
+    return sorted(name for name in os.listdir(backups_dir)
+                  if name.startswith(SNAPSHOT_PREFIX) and name.endswith(('.db', '.db.gz')))
+
+def rotate_snapshots(backups_dir, keep):
+    """只保留最新的 keep 个快照，返回删除的文件名"""
+    removed = list_snapshots(backups_dir)[:-keep] if keep > 0 else []
+    for name in removed:
+        os.remove(os.path.join(backups_dir, name))
+    return removed
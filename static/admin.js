@@ -0,0 +1,12 @@
+document.querySelector('.hamburger').addEventListener('click', function() {
+    document.querySelector('.sidebar').classList.toggle('active');
+});
+
+// 在移动端点击导航链接后自动关闭侧边栏
+if (window.innerWidth <= 768) {
+    document.querySelectorAll('.nav-links a').forEach(link => {
+        link.addEventListener('click', () => {
+            document.querySelector('.sidebar').classList.remove('active');
+        });
+    });
+}
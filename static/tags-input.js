@@ -0,0 +1,79 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const tagsInput = document.getElementById('tags');
+    const tagsSuggestions = document.getElementById('tags-suggestions');
+    let allTags = [];
+    
+    // 获取所有标签
+    fetch('/api/tags')
+        .then(response => response.json())
+        .then(data => {
+            allTags = data.tags;
+        })
+        .catch(error => console.error('获取标签失败:', error));
+    
+    // 处理标签输入和提示
+    tagsInput.addEventListener('input', function() {
+        const inputValue = this.value;
+        const lastTag = inputValue.split(',').pop().trim().toLowerCase();
+        
+        // 清空建议列表
+        tagsSuggestions.innerHTML = '';
+        
+        if (lastTag.length === 0) {
+            tagsSuggestions.style.display = 'none';
+            return;
+        }
+        
+        // 过滤匹配的标签
+        const matchingTags = allTags.filter(tag => 
+            tag.toLowerCase().includes(lastTag) && 
+            !inputValue.split(',').map(t => t.trim()).includes(tag)
+        );
+        
+        if (matchingTags.length === 0) {
+            tagsSuggestions.style.display = 'none';
+            return;
+        }
+        
+        // 显示匹配的标签
+        matchingTags.forEach(tag => {
+            const suggestionItem = document.createElement('div');
+            suggestionItem.className = 'suggestion-item';
+            suggestionItem.textContent = tag;
+            suggestionItem.addEventListener('click', function() {
+                // 获取当前输入值，去掉最后一个标签
+                const currentTags = inputValue.split(',').slice(0, -1).map(t => t.trim());
+                // 添加选中的标签
+                currentTags.push(tag);
+                // 更新输入框的值
+                tagsInput.value = currentTags.join(', ') + (currentTags.length > 0 ? ', ' : '');
+                // 隐藏建议列表
+                tagsSuggestions.style.display = 'none';
+                // 聚焦输入框
+                tagsInput.focus();
+            });
+            tagsSuggestions.appendChild(suggestionItem);
+        });
+        
+        tagsSuggestions.style.display = 'block';
+    });
+    
+    // 点击其他地方时隐藏建议列表
+    document.addEventListener('click', function(e) {
+        if (e.target !== tagsInput && e.target !== tagsSuggestions) {
+            tagsSuggestions.style.display = 'none';
+        }
+    });
+    
+    // 写新文章时，作为独立页面发布则隐藏标签输入
+    const isPageCheckbox = document.querySelector('input[name="is_page"]');
+    const tagsGroup = document.getElementById('tags-group');
+    if (isPageCheckbox && tagsGroup) {
+        function toggleTagsVisibility() {
+            tagsGroup.style.display = isPageCheckbox.checked ? 'none' : 'block';
+        }
+        
+        isPageCheckbox.addEventListener('change', toggleTagsVisibility);
+        toggleTagsVisibility(); // 初始化显示状态
+    }
+});
@@ -0,0 +1,64 @@
+from sqlalchemy import delete, exists, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, Tag, post_tags
+
+def parse_tag_names(text):
+    """解析逗号分隔的标签，去掉空白和重复项，保持原有顺序"""
+    names = []
+    for name in (text or '').split(','):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def resolve_tags(names, created=None):
+    """一次查询取出已有标签，批量创建缺少的标签，返回 {标签名: Tag}
+
+    created 为列表时，会把新创建的标签名追加进去。
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+
+    with db.session.no_autoflush:
+        found = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(names))}
+        missing = [name for name in names if name not in found]
+        if missing:
+            # 并发保存时可能已被其他请求创建，忽略冲突后重新查询
+            db.session.execute(
+                insert(Tag).on_conflict_do_nothing(index_elements=['name']),
+                [{'name': name, 'post_count': 0} for name in missing]
+            )
+            found.update({tag.name: tag for tag in Tag.query.filter(Tag.name.in_(missing))})
+            if created is not None:
+                created.extend(missing)
+
+    return {name: found[name] for name in names}
+
+def refresh_tag_counts(tag_ids=None):
+    """重新统计标签的文章数，tag_ids 为 None 时统计全部标签"""
+    if tag_ids is not None:
+        tag_ids = list(set(tag_ids))
+        if not tag_ids:
+            return
+    count = (select(func.count())
+             .select_from(post_tags)
+             .where(post_tags.c.tag_id == Tag.id)
+             .scalar_subquery())
+    stmt = update(Tag).values(post_count=count)
+    if tag_ids is not None:
+        stmt = stmt.where(Tag.id.in_(tag_ids))
+    db.session.execute(stmt.execution_options(synchronize_session=False))
+
+def delete_orphan_tags(tag_ids=None):
+    """删除没有文章的标签，tag_ids 为 None 时检查全部标签，返回删除数量"""
+    if tag_ids is not None:
+        tag_ids = list(set(tag_ids))
+        if not tag_ids:
+            return 0
+    stmt = delete(Tag).where(~exists().where(post_tags.c.tag_id == Tag.id))
+    if tag_ids is not None:
+        stmt = stmt.where(Tag.id.in_(tag_ids))
+    result = db.session.execute(stmt.execution_options(synchronize_session='fetch'))
+    return result.rowcount
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+PurEcho 后台任务
+保存文章后的后续工作写入 task 表，随文章一起提交，由网站进程中的工作线程执行，失败后按间隔重试
+直接运行时执行所有等待中的任务（TASKS_WORKERS 为 0 时可由定时任务调用）
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, update, delete, and_, or_, func
+from sqlalchemy.dialects.sqlite import insert
+
+# 添加项目路径到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import db, Task, RoutingSession, CHINA_TZ
+
+# 任务名 -> (处理函数, 说明)
+_handlers = {}
+# 执行任务时提交的事务不再触发同步执行
+_local = threading.local()
+# 工作线程清理旧记录的间隔（秒）
+PRUNE_INTERVAL = 3600
+# 保存的错误信息长度
+ERROR_MAX_CHARS = 4000
+
+def task(name, label=None):
+    """注册任务处理函数，enqueue 时传入的关键字参数原样传给它；函数内可以提交事务，抛出异常时任务稍后重试"""
+    def decorator(f):
+        _handlers[name] = (f, label or name)
+        return f
+    return decorator
+
+def task_label(name):
+    return _handlers[name][1] if name in _handlers else name
+
+def _now():
+    return datetime.now(CHINA_TZ)
+
+def enqueue(name, **payload):
+    """在当前事务中加入任务，随数据一起提交；提交后唤醒工作线程（TASKS_SYNC 为 true 时在当前线程执行）
+
+    已有任务名和参数都相同、还没开始执行的任务时不重复加入。
+    """
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    now = _now()
+    db.session.execute(
+        insert(Task)
+        .values(name=name, payload=data, dedupe_key=hashlib.sha1(f'{name}:{data}'.encode('utf-8')).hexdigest(),
+                status='pending', attempts=0, created_at=now, run_at=now)
+        .on_conflict_do_nothing()
+    )
+    db.session.info['tasks_enqueued'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('tasks_enqueued', False):
+        task_queue.notify()
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _after_rollback(session, previous_transaction):
+    session.info.pop('tasks_enqueued', None)
+
+class TaskQueue:
+    """每个进程 TASKS_WORKERS 个工作线程，从 task 表中领取任务执行
+
+    多个 gunicorn worker 同时领取时，由一条 UPDATE 语句选中并标记任务，同一任务只会被领取一次；
+    执行超过 TASKS_TIMEOUT 仍未结束的任务（进程被重启等）视为中断，会被重新领取。
+    """
+
+    def __init__(self):
+        self.app = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pruned = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['tasks'] = self
+        if not app.config['TASKS_SYNC'] and app.config['TASKS_WORKERS'] > 0:
+            # gunicorn preload 时应用在主进程创建，线程要在 fork 出的 worker 中启动
+            app.before_request(self.start)
+
+    def start(self):
+        """在当前进程中启动工作线程（已启动时直接返回）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._wake = threading.Event()
+            for i in range(self.app.config['TASKS_WORKERS']):
+                threading.Thread(target=self._work, name=f'purecho-task-{i}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def notify(self):
+        """有新任务提交时调用"""
+        if self.app is None:  # 命令行工具加入的任务由网站进程或 python tasks.py 执行
+            return
+        if self.app.config['TASKS_SYNC']:
+            if not getattr(_local, 'running', False):
+                self.run_pending()
+        elif self.app.config['TASKS_WORKERS'] > 0:
+            self.start()
+            self._wake.set()
+
+    def _work(self):
+        while True:
+            self._wake.clear()
+            try:
+                ran = self.run_next()
+            except Exception:  # 数据库被锁住等，稍后再试
+                traceback.print_exc()
+                ran = False
+            if not ran:
+                self._prune()
+                self._wake.wait(self.app.config['TASKS_POLL_INTERVAL'])
+
+    def _claim(self):
+        now = _now()
+        ready = or_(and_(Task.status == 'pending', Task.run_at <= now),
+                    and_(Task.status == 'running',
+                         Task.started_at < now - timedelta(seconds=self.app.config['TASKS_TIMEOUT'])))
+        next_id = select(Task.id).where(ready).order_by(Task.id).limit(1).scalar_subquery()
+        row = db.session.execute(
+            update(Task)
+            .where(Task.id == next_id)
+            .values(status='running', started_at=now, attempts=Task.attempts + 1)
+            .returning(Task.id, Task.name, Task.payload, Task.dedupe_key, Task.attempts)
+            .execution_options(synchronize_session=False)
+        ).first()
+        db.session.commit()
+        return row
+
+    def run_next(self):
+        """领取并执行一个已到时间的任务，没有任务时返回 False"""
+        with self.app.app_context():
+            claimed = self._claim()
+            if claimed is None:
+                return False
+            id, name, payload, dedupe_key, attempts = claimed
+            try:
+                if name not in _handlers:
+                    raise LookupError(f'未注册的任务：{name}')
+                _handlers[name][0](**json.loads(payload))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f'后台任务 {name}（#{id}）第 {attempts} 次执行出错：{str(e)}')
+                self._failed(id, dedupe_key, attempts, traceback.format_exc()[-ERROR_MAX_CHARS:])
+            else:
+                db.session.execute(update(Task).where(Task.id == id)
+                                   .values(status='done', finished_at=_now(), last_error=None))
+            db.session.commit()
+            return True
+
+    def _failed(self, id, dedupe_key, attempts, error):
+        config = self.app.config
+        if attempts >= config['TASKS_MAX_ATTEMPTS']:
+            db.session.execute(update(Task).where(Task.id == id)
+                               .values(status='failed', finished_at=_now(), last_error=error))
+            return
+        if db.session.query(Task.id).filter(Task.dedupe_key == dedupe_key, Task.status == 'pending').first():
+            # 执行期间又加入了同样的任务，由那个任务完成
+            db.session.execute(delete(Task).where(Task.id == id))
+            return
+        # 间隔 TASKS_RETRY_DELAY、2 倍、4 倍……秒后重试
+        delay = config['TASKS_RETRY_DELAY'] * 2 ** (attempts - 1)
+        db.session.execute(update(Task).where(Task.id == id)
+                           .values(status='pending', run_at=_now() + timedelta(seconds=delay), last_error=error))
+
+    def run_pending(self):
+        """在当前线程中执行所有已到时间的任务，返回执行的任务数"""
+        _local.running = True
+        try:
+            count = 0
+            while self.run_next():
+                count += 1
+            return count
+        finally:
+            _local.running = False
+
+    def _prune(self):
+        if time.monotonic() - self._pruned < PRUNE_INTERVAL:
+            return
+        self._pruned = time.monotonic()
+        with self.app.app_context():
+            prune_tasks(self.app.config['TASKS_KEEP_DAYS'])
+            db.session.commit()
+
+task_queue = TaskQueue()
+
+def prune_tasks(keep_days):
+    """删除 keep_days 天前完成的任务记录，返回删除数量"""
+    result = db.session.execute(delete(Task).where(Task.status == 'done',
+                                                   Task.finished_at < _now() - timedelta(days=keep_days)))
+    return result.rowcount
+
+def retry_failed():
+    """把失败的任务重新加入队列，返回数量（已有同样的任务在等待时跳过）"""
+    result = db.session.execute(
+        update(Task).prefix_with('OR IGNORE')
+        .where(Task.status == 'failed')
+        .values(status='pending', attempts=0, run_at=_now(), started_at=None, finished_at=None)
+    )
+    db.session.info['tasks_enqueued'] = True
+    return result.rowcount
+
+def clear_finished():
+    """删除所有已完成的任务记录，返回删除数量"""
+    return db.session.execute(delete(Task).where(Task.status == 'done')).rowcount
+
+def task_counts():
+    """{状态: 任务数}"""
+    return dict(db.session.query(Task.status, func.count()).group_by(Task.status).all())
+
+def recent_tasks(limit):
+    return Task.query.order_by(Task.id.desc()).limit(limit).all()
+
+def main():
+    from app import app
+    # 直接运行时本文件是 __main__ 模块，处理函数注册在 app.py 导入的 tasks 模块中
+    from tasks import task_queue, task_counts
+
+    with app.app_context():
+        count = task_queue.run_pending()
+        counts = task_counts()
+    print(f'✅ 执行了 {count} 个任务')
+    if counts.get('pending'):
+        print(f'  ⏳ 还有 {counts["pending"]} 个任务等待重试')
+    if counts.get('failed'):
+        print(f'  ❌ {counts["failed"]} 个任务已失败，可在后台任务页面查看并重试')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+
+# Config 在导入时读取环境变量，必须在导入应用之前设置
+_workdir = tempfile.mkdtemp(prefix='purecho-test-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_workdir, 'test.db')
+os.environ['CONTENT_VERSION_FILE'] = os.path.join(_workdir, 'content_version')
+os.environ['TASKS_SYNC'] = 'true'
+os.environ['ASSET_FINGERPRINT'] = 'false'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    from init_db import init_database
+
+    init_database()
+    return app
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+    return client
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Post, CHINA_TZ
+from cache import bump_content_version
+
+@pytest.fixture
+def public(app, client):
+    client.post('/admin/write', data={'title': '条件请求', 'content': '正文' * 400, 'tags': '', 'slug': 'etag-test'})
+    return app.test_client()
+
+@pytest.mark.parametrize('encoding', ['gzip', 'identity'])
+def test_not_modified_keeps_etag(public, encoding):
+    """压缩与否，304 响应都返回与 200 响应相同的 ETag"""
+    headers = {'Accept-Encoding': encoding}
+    response = public.get('/post/etag-test', headers=headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+
+    cached = public.get('/post/etag-test', headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == etag
+
+    # 弱比较：去掉 W/ 前缀也能匹配
+    cached = public.get('/post/etag-test', headers={**headers, 'If-None-Match': etag[2:]})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == etag
+
+def test_post_last_modified_follows_site_changes(app, public):
+    """文章页包含相关文章，其他文章修改后按 If-Modified-Since 也不能返回 304"""
+    with app.app_context():
+        db.session.execute(db.update(Post).where(Post.slug == 'etag-test')
+                           .values(updated_at=datetime.now(CHINA_TZ) - timedelta(days=1)))
+        db.session.commit()
+        bump_content_version()
+
+    response = public.get('/post/etag-test')
+    assert response.last_modified > datetime.now(CHINA_TZ) - timedelta(hours=1)
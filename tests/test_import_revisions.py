@@ -0,0 +1,15 @@
+from models import Post
+from importer import import_records
+from revisions import list_revisions, load_revision
+
+def test_import_update_records_revision(app, client):
+    client.post('/admin/write', data={'title': '原来的标题', 'content': '原来的正文', 'tags': '', 'slug': 'import-revision'})
+    record = {'title': '导入的标题', 'content': '导入的正文', 'slug': 'import-revision', 'tags': []}
+    with app.app_context():
+        stats = import_records([('post', record)], conflict='update')
+        assert stats.updated == 1
+        post_id = Post.query.filter_by(slug='import-revision').one().id
+        numbers = sorted(row.number for row in list_revisions(post_id))
+        first, last = load_revision(post_id, numbers[0]), load_revision(post_id, numbers[-1])
+    assert (first.title, first.content) == ('原来的标题', '原来的正文')
+    assert (last.title, last.content) == ('导入的标题', '导入的正文')
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+
+from models import db, Post, CHINA_TZ
+from exporter import iter_posts
+from importer import import_records
+from manifest import watermark, new_entry, since
+
+def test_tag_only_edit_is_in_incremental_export(app, client):
+    client.post('/admin/write', data={'title': 'p1', 'content': '正文', 'tags': 'a,b', 'slug': 'tag-only-edit'})
+    with app.app_context():
+        post = Post.query.filter_by(slug='tag-only-edit').one()
+        post_id = post.id
+        # 文章在上一次备份之前就已保存
+        db.session.execute(db.update(Post).where(Post.id == post_id)
+                           .values(updated_at=datetime.now(CHINA_TZ) - timedelta(days=1)))
+        db.session.commit()
+        entry = new_entry('full.json', 'full', watermark())
+
+    client.post(f'/edit/{post_id}', data={'title': 'p1', 'content': '正文', 'tags': 'z'})
+
+    with app.app_context():
+        exported = [item for item in iter_posts(since=since(entry)) if item['id'] == post_id]
+    assert len(exported) == 1
+    assert exported[0]['tags'] == ['z']
+
+def test_import_update_is_in_incremental_export(app, client):
+    client.post('/admin/write', data={'title': '原来的标题', 'content': '原来的正文', 'tags': '', 'slug': 'import-update'})
+    with app.app_context():
+        entry = new_entry('full.json', 'full', watermark())
+        # 备份中的修改时间早于上一次备份
+        record = {'title': '导入的标题', 'content': '导入的正文', 'slug': 'import-update', 'tags': [],
+                  'updated_at': (datetime.now(CHINA_TZ) - timedelta(days=30)).replace(tzinfo=None).isoformat()}
+        import_records([('post', record)], conflict='update')
+        exported = [item for item in iter_posts(since=since(entry)) if item['slug'] == 'import-update']
+    assert len(exported) == 1
+    assert exported[0]['content'] == '导入的正文'
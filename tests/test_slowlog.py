@@ -0,0 +1,17 @@
+import pytest
+
+from slowlog import full_scans
+
+@pytest.mark.parametrize('detail', ['SCAN post', 'SCAN TABLE post'])
+def test_full_scan(detail):
+    assert full_scans([(2, 0, detail)]) == ['post']
+
+@pytest.mark.parametrize('detail', [
+    'SCAN post USING INDEX ix_post_is_page_created_at_id',
+    'SCAN TABLE post USING INDEX ix_post_is_page_created_at_id',
+    'SCAN TABLE post_fts VIRTUAL TABLE INDEX 0:M1',
+    'SEARCH post USING INTEGER PRIMARY KEY (rowid=?)',
+    'SEARCH TABLE post USING INTEGER PRIMARY KEY (rowid=?)',
+])
+def test_not_full_scan(detail):
+    assert full_scans([(2, 0, detail)]) == []
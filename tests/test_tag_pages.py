@@ -0,0 +1,29 @@
+import io
+import json
+
+from models import db, Post, post_tags
+
+def test_tag_page_follows_imported_created_at(app, client):
+    for n in (1, 2):
+        client.post('/admin/write', data={'title': f'tag-order-{n}', 'content': '正文', 'tags': 'order',
+                                          'slug': f'tag-order-{n}'})
+    with app.app_context():
+        rows = db.session.execute(db.select(post_tags.c.created_at, Post.created_at)
+                                  .join(Post, Post.id == post_tags.c.post_id)
+                                  .where(Post.slug.like('tag-order-%'))).all()
+    assert rows and all(copied == created for copied, created in rows)
+
+    # 覆盖导入把第 2 篇的创建时间改到第 1 篇之前，标签页的顺序随之改变
+    backup = json.loads(client.get('/admin/export?format=json').data)
+    backup['posts'] = [post for post in backup['posts'] if post['slug'] == 'tag-order-2']
+    backup['posts'][0]['created_at'] = '2000-01-01T00:00:00'
+    response = client.post('/admin/import', data={'conflict': 'update',
+                                                  'file': (io.BytesIO(json.dumps(backup).encode()), 'backup.json')})
+    assert response.status_code == 302
+
+    html = app.test_client().get('/tag/order').get_data(as_text=True)
+    assert html.index('tag-order-1') < html.index('tag-order-2')
+    with app.app_context():
+        copied = (db.session.query(post_tags.c.created_at).join(Post, Post.id == post_tags.c.post_id)
+                  .filter(Post.slug == 'tag-order-2').scalar())
+    assert copied.year == 2000